@@ -1,28 +1,32 @@
 import logging
-import traceback
 
+import jwt
 from fastapi import APIRouter, Depends, Form, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from jose import JWTError, jwt
 
-from backend.core.auth import Auth
+from backend.api.dependencies import get_auth, get_db
+from backend.core.auth import Auth, oauth2_scheme
+from backend.core.database import Database
 from backend.core.rate_limit import limiter
 
-auth = Auth()
-
-
 logger = logging.getLogger(__name__)
 
-auth_router = APIRouter(tags=["Authentication"])
+auth_router = APIRouter(tags=["Authentication"], default_response_class=ORJSONResponse)
 
 
 @auth_router.post("/token")
 @limiter.limit("5/minute")
-def get_token(request: Request, token: str = Depends(auth.oauth2_scheme)):
+def get_token(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    auth: Auth = Depends(get_auth),
+):
     """
     Endpoint to verify the access token.
     """
-    logger.info("Verifying access token.")
+    logger.debug("Verifying access token.")
     try:
         payload = auth.verify_token(access_token=token)
 
@@ -33,13 +37,13 @@ def get_token(request: Request, token: str = Depends(auth.oauth2_scheme)):
                 detail="Invalid access token",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        logger.info("Access token verified successfully.")
-        return {"success": True, "token": token, "user": payload["sub"]}
+        logger.debug("Access token verified successfully.")
+        return ORJSONResponse({"success": True, "token": token, "user": payload["sub"]})
     except HTTPException as e:
-        logger.error(f"HTTP Error during token verification: {e.detail}")
+        logger.error("HTTP Error during token verification: %s", e.detail)
         raise e
     except Exception as e:
-        logger.error(f"Unexpected error verifying token: {traceback.format_exc()}")
+        logger.exception("Unexpected error verifying token")
         raise HTTPException(
             status_code=500, detail="An error occurred while verifying the token."
         )
@@ -48,12 +52,14 @@ def get_token(request: Request, token: str = Depends(auth.oauth2_scheme)):
 @auth_router.post("/refresh")
 @limiter.limit("5/minute")
 async def refresh_token(
-    request: Request, refresh_token: str = Form(..., alias="refresh_token")
+    request: Request,
+    refresh_token: str = Form(..., alias="refresh_token"),
+    auth: Auth = Depends(get_auth),
 ):
     """
     Endpoint to refresh the access token using a refresh token.
     """
-    logger.info("Refreshing access token.")
+    logger.debug("Refreshing access token.")
     try:
         if not refresh_token:
             logger.error("Refresh token is required.")
@@ -63,12 +69,17 @@ async def refresh_token(
                 headers={"WWW-Authenticate": "Bearer"},
             )
         try:
-            SECRET_KEY = auth.secret_key
-            ALGORITHM = auth.algorithm
-            payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+            payload = jwt.decode(
+                refresh_token, auth.jwt_key, algorithms=[auth.algorithm]
+            )
             user = payload.get("sub")
             user_email = payload.get("email")
-            password = payload.get("password")
+            # Older tokens carry the encrypted password hash instead of "sid"
+            session = (
+                {"sid": payload["sid"]}
+                if "sid" in payload
+                else {"password": payload.get("password")}
+            )
 
             if not user_email != "refresh":
                 logger.error("Invalid refresh token payload.")
@@ -77,8 +88,8 @@ async def refresh_token(
                     detail="Invalid refresh token",
                     headers={"WWW-Authenticate": "Bearer"},
                 )
-        except JWTError as e:
-            logger.error(f"JWT Error during refresh token verification: {str(e)}")
+        except jwt.InvalidTokenError as e:
+            logger.error("JWT Error during refresh token verification: %s", e)
             raise HTTPException(
                 status_code=401,
                 detail="Invalid refresh token",
@@ -86,22 +97,24 @@ async def refresh_token(
             )
 
         new_acess_token = auth.create_access_token(
-            data={"sub": user, "email": user_email, "password": password},
+            data={"sub": user, "email": user_email, **session},
+        )
+        logger.info("Access token refreshed successfully for user: %s", user_email)
+
+        return ORJSONResponse(
+            {
+                "success": True,
+                "token_type": "bearer",
+                "access_token": new_acess_token,
+                "expires_in_minutes": 500,
+            }
         )
-        logger.info(f"Access token refreshed successfully for user: {user_email}")
-
-        return {
-            "success": True,
-            "token_type": "bearer",
-            "access_token": new_acess_token,
-            "expires_in_minutes": 500,
-        }
 
     except HTTPException as e:
-        logger.error(f"HTTP Error during token refresh: {e.detail}")
+        logger.error("HTTP Error during token refresh: %s", e.detail)
         raise e
     except Exception as e:
-        logger.error(f"Unexpected error during token refresh: {traceback.format_exc()}")
+        logger.exception("Unexpected error during token refresh")
         raise HTTPException(
             status_code=500, detail="An error occurred while refreshing the token."
         )
@@ -109,65 +122,87 @@ async def refresh_token(
 
 @auth_router.post("/login")
 @limiter.limit("5/minute")
-async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(
+    request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    auth: Auth = Depends(get_auth),
+    db: Database = Depends(get_db),
+):
     """
     Endpoint for user login, returning an access token.
     """
-    logger.info(f"User login attempt: {form_data.username}")
+    logger.debug("User login attempt: %s", form_data.username)
 
     try:
-        from backend.core.database import Database
-
-        db = Database()
-        result = db.get_user_from_db(email=form_data.username)
+        result = await run_in_threadpool(db.get_user_from_db, email=form_data.username)
 
         if not result.get("success"):
-            logger.warning(f"User {form_data.username} not found or invalid data.")
+            logger.warning("User %s not found or invalid data.", form_data.username)
             raise HTTPException(
                 status_code=400,
                 detail="Incorrect username or password",
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        if not auth.verify_password(
-            plain_password=form_data.password, hashed_password=result["password_hash"]
+        # bcrypt is deliberately slow, keep it off the event loop
+        if not await run_in_threadpool(
+            auth.verify_password,
+            plain_password=form_data.password,
+            hashed_password=result["password_hash"],
         ):
-            logger.warning(f"Invalid login attempt for user: {form_data.username}")
+            logger.warning("Invalid login attempt for user: %s", form_data.username)
             raise HTTPException(
                 status_code=400,
                 detail="Incorrect username or password",
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
+        if auth.needs_rehash(result["password_hash"]):
+            logger.info("Upgrading password hash for user: %s", form_data.username)
+            result["password_hash"] = await run_in_threadpool(
+                auth.get_password_hash, form_data.password
+            )
+            await run_in_threadpool(
+                db.update_password_hash,
+                email=result["email"],
+                password_hash=result["password_hash"],
+            )
+
         access_token = auth.create_access_token(
             data={
                 "sub": result["email"],
                 "email": result["email"],
-                "password": result["password_hash"],
+                "sid": auth.session_id(result["password_hash"]),
             },
             encrypt_sensitive_data=True,
         )
 
-        logger.info(f"User {form_data.username} logged in successfully.")
+        logger.info("User %s logged in successfully.", form_data.username)
 
-        return {"success": True, "access_token": access_token, "token_type": "bearer"}
+        return ORJSONResponse(
+            {"success": True, "access_token": access_token, "token_type": "bearer"}
+        )
 
     except HTTPException as e:
-        logger.error(f"HTTP Error during login: {e.detail}")
+        logger.error("HTTP Error during login: %s", e.detail)
         raise e
     except Exception as e:
-        logger.error(f"Unexpected error during login: {traceback.format_exc()}")
+        logger.exception("Unexpected error during login")
         raise HTTPException(status_code=500, detail="An error occurred during login.")
 
 
 @auth_router.post("/register")
 @limiter.limit("3/minute")
-async def register(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+async def register(
+    request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: Database = Depends(get_db),
+):
     """
     Endpoint for user registration.
 
     """
-    logger.info(f"User registration attempt: {form_data.username}")
+    logger.debug("User registration attempt: %s", form_data.username)
 
     try:
 
@@ -179,28 +214,26 @@ async def register(request: Request, form_data: OAuth2PasswordRequestForm = Depe
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        from backend.core.database import Database
-
-        db = Database()
-        user = db.get_user_from_db(email=form_data.username)
+        result = await run_in_threadpool(
+            db.user_register, email=form_data.username, password=form_data.password
+        )
 
-        if user.get("success"):
-            logger.warning(f"User {form_data.username} already exists.")
+        if not result.get("success"):
+            logger.warning("User %s already exists.", form_data.username)
             raise HTTPException(
                 status_code=400,
                 detail="User already exists",
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        db.user_register(email=form_data.username, password=form_data.password)
-        logger.info(f"User {form_data.username} registered successfully.")
+        logger.info("User %s registered successfully.", form_data.username)
 
         return {"success": True, "message": "User registered successfully."}
     except HTTPException as e:
-        logger.error(f"HTTP Error during registration: {e.detail}")
+        logger.error("HTTP Error during registration: %s", e.detail)
         raise e
     except Exception as e:
-        logger.error(f"Unexpected error during registration: {traceback.format_exc()}")
+        logger.exception("Unexpected error during registration")
         raise HTTPException(
             status_code=500, detail="An error occurred during registration."
         )
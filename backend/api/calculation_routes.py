@@ -1,8 +1,12 @@
 import logging
-import traceback
 
-from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 
+from backend.api.dependencies import get_auth, get_calculation
+from backend.core.auth import Auth, oauth2_scheme
+from backend.core.calculation import Calculation
 from backend.core.rate_limit import limiter
 from backend.models import CalculationRequest, ResponseCalculation
 
@@ -11,13 +15,19 @@ logger = logging.getLogger(__name__)
 calculation_router = APIRouter(tags=["Calculation"])
 
 
-@calculation_router.post("/calculation", response_model=ResponseCalculation)
+@calculation_router.post(
+    "/calculation",
+    response_model=ResponseCalculation,
+    response_class=ORJSONResponse,
+)
 @limiter.limit("5/minute")
-def calculate(
+async def calculate(
     request: Request,
     req: CalculationRequest,
-    authorization: str = Header(..., alias="Authorization"),
-) -> dict:
+    authorization: str = Depends(oauth2_scheme),
+    auth: Auth = Depends(get_auth),
+    calc: Calculation = Depends(get_calculation),
+) -> ORJSONResponse:
     """
     Perform a financial calculation based on the provided request data.
     Args:
@@ -27,10 +37,7 @@ def calculate(
         ResponseCalculation: The result of the calculation.
     """
     try:
-        from backend.core.auth import Auth
-
-        auth = Auth()
-        if not auth.verify_token(access_token=authorization):
+        if not await run_in_threadpool(auth.verify_token, access_token=authorization):
             logger.warning("Invalid token.")
             raise HTTPException(
                 status_code=401,
@@ -38,39 +45,42 @@ def calculate(
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        logger.info(f"Starting calculation: {dict(req)}")
-
-        from backend.core.calculation import Calculation
+        logger.info("Starting calculation: %s", req)
 
-        calc = Calculation()
-        total_value, amount_invested, total_interest, months = calc.calculate_totals(
+        total_value, amount_invested, total_interest, months = await run_in_threadpool(
+            calc.calculate_totals,
             initial_value=req.initial_value,
             monthly_contribution=req.monthly_contribution,
             annual_interest=req.annual_interest,
             number_months=req.months,
+            columnar=req.columnar,
         )
 
-        logger.info("Calculation ended successfully.")
+        logger.debug("Calculation ended successfully.")
 
-        return ResponseCalculation(
-            success=True,
-            data={
-                "total_value": total_value,
-                "amount_invested": amount_invested,
-                "total_interest": total_interest,
-                "months": months,
-            },
-            message="Calculation Performed.",
+        # Returned as a response directly, the payload is built from trusted values
+        # so it is serialized once instead of being validated against the model.
+        return ORJSONResponse(
+            {
+                "success": True,
+                "data": {
+                    "total_value": total_value,
+                    "amount_invested": amount_invested,
+                    "total_interest": total_interest,
+                    "months": months,
+                },
+                "message": "Calculation Performed.",
+            }
         )
 
     except ValueError as e:
-        logger.error(f"Validation error: {str(e)}")
+        logger.error("Validation error: %s", e)
         raise HTTPException(status_code=422, detail=str(e))
 
     except HTTPException as e:
-        logger.error(f"HTTP Error: {e.detail}")
+        logger.error("HTTP Error: %s", e.detail)
         raise e
 
     except Exception as e:
-        logger.error(f"Unexpected error: {traceback.format_exc()}")
+        logger.exception("Unexpected error")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
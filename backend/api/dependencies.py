@@ -0,0 +1,39 @@
+from functools import lru_cache
+
+from backend.core.auth import Auth, auth_singleton
+from backend.core.calculation import Calculation
+from backend.core.database import Database
+from backend.core.mercadopago import PaymentProcessor
+
+_db = Database()
+_calc = Calculation()
+
+
+def get_auth() -> Auth:
+    """
+    Dependency returning the shared Auth instance.
+    """
+    return auth_singleton
+
+
+def get_db() -> Database:
+    """
+    Dependency returning the shared Database instance.
+    """
+    return _db
+
+
+def get_calculation() -> Calculation:
+    """
+    Dependency returning the shared Calculation instance.
+    """
+    return _calc
+
+
+@lru_cache(maxsize=1)
+def get_payment_processor() -> PaymentProcessor:
+    """
+    Dependency returning the shared PaymentProcessor instance.
+    Created on first use so the app can start without MercadoPago credentials.
+    """
+    return PaymentProcessor()
@@ -1,10 +1,13 @@
+import hmac
 import logging
 import os
-import traceback
 
-from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, Response
 
-from backend.core.auth import Auth
+from backend.api.dependencies import get_auth, get_payment_processor
+from backend.core.auth import Auth, oauth2_scheme
 from backend.core.mercadopago import PaymentProcessor
 from backend.core.rate_limit import limiter
 from backend.payment_model import (
@@ -17,13 +20,25 @@ from backend.payment_model import (
 logger = logging.getLogger(__name__)
 payment_router = APIRouter(tags=["Payments"])
 
+_MP_CALLBACK_FIELDS = frozenset(MPCallback.model_fields)
+_MP_WEBHOOK_SECRET = os.getenv("MP_WEBHOOK_SECRET", "").encode()
 
-@payment_router.post("/payments/create", response_model=PaymentResponse)
+if not _MP_WEBHOOK_SECRET:
+    logger.warning("MP_WEBHOOK_SECRET is not set, webhook requests will be rejected.")
+
+
+@payment_router.post(
+    "/payments/create",
+    response_model=PaymentResponse,
+    response_class=ORJSONResponse,
+)
 @limiter.limit("5/minute")
 async def create_payment(
     request: Request,
     payment_request: PaymentRequest,
-    authorization: str = Header(..., alias="Authorization"),
+    authorization: str = Depends(oauth2_scheme),
+    auth: Auth = Depends(get_auth),
+    processor: PaymentProcessor = Depends(get_payment_processor),
 ):
     """
     Create a payment preference using MercadoPago.
@@ -36,8 +51,7 @@ async def create_payment(
         PreferenceResponse: Response containing the payment URL and status.
     """
 
-    auth = Auth()
-    if not auth.verify_token(access_token=authorization):
+    if not await run_in_threadpool(auth.verify_token, access_token=authorization):
         logger.warning("Invalid token.")
         raise HTTPException(
             status_code=401,
@@ -46,33 +60,27 @@ async def create_payment(
         )
 
     try:
-        processor = PaymentProcessor()
-        items = [
-            {"symbol": item.symbol, "quantity": item.quantity}
-            for item in payment_request.items
-        ]
-
-        if not items:
-            logger.error("Items list cannot be empty.")
-            raise HTTPException(status_code=400, detail="Items list cannot be empty")
-
-        result = processor.create_payment_preference(
-            user_id=payment_request.user_id, items=items
+        result = await run_in_threadpool(
+            processor.create_payment_preference,
+            user_id=payment_request.user_id,
+            items=payment_request.items,
         )
 
-        return PaymentResponse(
-            payment_url=result["payment_url"],
-            transaction_ids=result["transaction_ids"],
+        return ORJSONResponse(
+            {
+                "payment_url": result["payment_url"],
+                "transaction_ids": result["transaction_ids"],
+            }
         )
 
     except ValueError as ve:
-        logger.error(f"Error creating payment preference: {ve}")
-        logger.debug(traceback.format_exc())
+        logger.error("Error creating payment preference: %s", ve)
+        logger.debug("Traceback:", exc_info=True)
         raise HTTPException(status_code=400, detail=str(ve))
 
     except Exception as e:
-        logger.error(f"Error creating payment preference: {e}")
-        logger.debug(traceback.format_exc())
+        logger.error("Error creating payment preference: %s", e)
+        logger.debug("Traceback:", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
@@ -80,7 +88,7 @@ mp_callback_router = APIRouter(tags=["MercadoPago Callback"])
 
 
 @mp_callback_router.get("/payment/success", response_model=MPCallbackResponse)
-async def payment_success(request: Request) -> MPCallbackResponse:
+async def payment_success(request: Request) -> Response:
     """
     Receive parameter from MercadoPago when payment is successful.
     """
@@ -88,35 +96,43 @@ async def payment_success(request: Request) -> MPCallbackResponse:
 
     logger.info("MercadoPago callback received")
 
-    callback_data = {key: value for key, value in params.items()}
+    callback_data = {key: params[key] for key in _MP_CALLBACK_FIELDS if key in params}
 
     try:
-        validate_callback = MPCallback(**callback_data)
+        validate_callback = MPCallback.model_validate(callback_data)
 
     except Exception as e:
-        logger.error(f"Invalid callback data: {e}")
-        logger.debug(traceback.format_exc())
+        logger.error("Invalid callback data: %s", e)
+        logger.debug("Traceback:", exc_info=True)
         raise HTTPException(status_code=400, detail="Invalid callback data format")
 
-    logger.info("Callback data validated successfully")
+    logger.debug("Callback data validated successfully")
 
-    return MPCallbackResponse(success=True, data=validate_callback)
+    # Serialized by pydantic-core straight from the validated model, no dict copy
+    return Response(
+        content=MPCallbackResponse(
+            success=True, data=validate_callback
+        ).model_dump_json(),
+        media_type="application/json",
+    )
 
 
 @payment_router.post("/payments/webhook")
 async def payment_webhook(
     request: Request,
     x_signature: str = Header(...),
+    processor: PaymentProcessor = Depends(get_payment_processor),
 ):
     """Handle Mercado Pago webhook notifications."""
-    if x_signature != os.getenv("MP_WEBHOOK_SECRET"):
+    if not _MP_WEBHOOK_SECRET or not hmac.compare_digest(
+        x_signature.encode(), _MP_WEBHOOK_SECRET
+    ):
         raise HTTPException(status_code=401, detail="Invalid signature")
 
     try:
         payload = await request.json()
-        processor = PaymentProcessor()
-        processor.process_webhook(payload)
+        await run_in_threadpool(processor.process_webhook, payload)
         return {"status": "success"}
     except Exception as e:
-        logger.error(f"Webhook processing error: {e}")
+        logger.error("Webhook processing error: %s", e)
         raise HTTPException(status_code=500, detail="Webhook processing failed")
@@ -1,20 +1,370 @@
+import asyncio
+import collections
+import hashlib
 import logging
-import traceback
+import os
+import re
+import weakref
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, Dict, List, Tuple
 
-from fastapi import APIRouter, Depends, Header, HTTPException, Path, Request
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, Response
+from redis.exceptions import RedisError
+from yfinance.exceptions import YFException
 
-from backend.core.rate_limit import limiter
+from backend.api.dependencies import get_auth
+from backend.core.auth import Auth, oauth2_scheme
+from backend.core.cache import TTLCache, get_redis
+from backend.core.rate_limit import limiter, local_limit
 from backend.core.stock import Stock
-from backend.models import PaginatedHistory, RequestHistoryParams
+from backend.models import (
+    PaginatedHistory,
+    RequestBatchHistoryParams,
+    RequestHistoryParams,
+)
 
 logger = logging.getLogger(__name__)
 
-stock_router = APIRouter(tags=["Stock"])
+stock_router = APIRouter(tags=["Stock"], default_response_class=ORJSONResponse)
 
+# Yahoo Finance calls run on their own bounded pool, so a burst of slow fetches
+# cannot take every threadpool thread and stall the other requests. Stock caps
+# the calls actually sent to Yahoo with the same YF_MAX_WORKERS.
+_yf_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("YF_MAX_WORKERS", "16")), thread_name_prefix="yf"
+)
+_YF_TIMEOUT = float(os.getenv("YF_TIMEOUT_SECONDS", "8"))
 
-@stock_router.get("/stock/{ticker}")
+
+class UpstreamError(HTTPException):
+    """
+    Yahoo Finance could not serve the data for a request.
+    """
+
+
+# Failures of the Yahoo Finance calls, anything else is a bug and is left to the
+# application's last-resort handler. Batches time out inside Stock.fetch_many too.
+_TIMEOUT_ERRORS = (asyncio.TimeoutError, futures.TimeoutError)
+_UPSTREAM_ERRORS = _TIMEOUT_ERRORS + (YFException, KeyError, ValueError)
+
+
+def _upstream_error(
+    e: Exception,
+    symbols: str,
+    status_code: int = 500,
+    detail: str = "An error occurred while fetching stock info.",
+) -> UpstreamError:
+    """
+    Map a failed Yahoo Finance call to the response sent to the client.
+    Args:
+        e (Exception): One of _UPSTREAM_ERRORS.
+        symbols (str): Symbols of the request, for the logs.
+        status_code (int): Status for failures other than timeouts and rate limits.
+        detail (str): Detail sent with status_code.
+    Returns:
+        UpstreamError: Exception to raise.
+    """
+    if isinstance(e, _TIMEOUT_ERRORS):
+        logger.warning("Timed out fetching %s from Yahoo Finance.", symbols)
+        return UpstreamError(
+            status_code=504, detail="Timed out fetching stock data, try again later."
+        )
+
+    if "rate limit" in str(e).lower():
+        logger.warning("Rate limit exceeded fetching %s: %s", symbols, e)
+        return UpstreamError(
+            status_code=429, detail="Rate limit exceeded. Please try again later."
+        )
+
+    logger.error("Error fetching %s: %s", symbols, e)
+    return UpstreamError(status_code=status_code, detail=detail)
+
+
+# Tickers accepted by a single /stocks request
+_MAX_TICKERS = 20
+_TICKER_RE = re.compile(r"^[A-Z0-9.]{1,6}$")
+
+# One quote fetch per ticker at a time, the result is cached by Stock and, when
+# REDIS_URL is set, shared in Redis
+_QUOTE_CACHE_TTL = max(0, int(float(os.getenv("QUOTE_CACHE_TTL_SECONDS", "15"))))
+_quote_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = (
+    weakref.WeakValueDictionary()
+)
+
+# Requests per ticker, halved on every refresh, to pick the quotes kept warm.
+# Only counted when the refresher runs, nothing else ever shrinks the counter.
+_ticker_hits: "collections.Counter[str]" = collections.Counter()
+_HOT_TICKERS_COUNT = int(os.getenv("HOT_TICKERS_COUNT", "20"))
+_HOT_TICKERS_REFRESH = float(os.getenv("HOT_TICKERS_REFRESH_SECONDS", "0"))
+
+# History pages are kept serialized in memory and, when REDIS_URL is set, shared
+# in Redis
+_HISTORY_CACHE_TTL = max(
+    0, int(float(os.getenv("HISTORY_CACHE_TTL_SECONDS", "300")))
+)
+_history_cache = TTLCache(maxsize=4096, ttl=_HISTORY_CACHE_TTL)
+
+# History fetches in progress, shared by identical concurrent requests
+_history_inflight: Dict[Tuple[str, int, int], asyncio.Future] = {}
+
+
+async def _run_yf(func, *args):
+    """
+    Run a blocking yfinance call on the Yahoo Finance pool.
+    Args:
+        func (Callable): Function to call.
+        *args: Positional arguments for the function.
+    Returns:
+        Any: The result of the call.
+    Raises:
+        asyncio.TimeoutError: If the call takes longer than YF_TIMEOUT_SECONDS.
+    """
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(
+        loop.run_in_executor(_yf_executor, func, *args), _YF_TIMEOUT
+    )
+
+
+def _parse_tickers(tickers: str) -> List[str]:
+    """
+    Split a comma separated list of tickers, dropping duplicates.
+    Args:
+        tickers (str): Comma separated stock ticker symbols.
+    Returns:
+        List[str]: The tickers, in the order given.
+    Raises:
+        HTTPException: If there are too many tickers or any of them is invalid.
+    """
+    symbols = list(dict.fromkeys(t.strip() for t in tickers.split(",") if t.strip()))
+    if not symbols or len(symbols) > _MAX_TICKERS:
+        raise HTTPException(
+            status_code=422, detail=f"Provide between 1 and {_MAX_TICKERS} tickers."
+        )
+    invalid = [symbol for symbol in symbols if not _TICKER_RE.match(symbol)]
+    if invalid:
+        raise HTTPException(
+            status_code=422, detail=f"Invalid ticker symbols: {', '.join(invalid)}"
+        )
+    return symbols
+
+
+def _cacheable_response(request: Request, body: bytes, max_age: int) -> Response:
+    """
+    JSON response carrying an ETag, answering 304 when the client already has it.
+    Args:
+        request (Request): Incoming request, read for If-None-Match.
+        body (bytes): Serialized JSON body.
+        max_age (int): Seconds the client may reuse the response.
+    Returns:
+        Response: The body, or an empty 304 response.
+    """
+    etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    # Responses depend on the Authorization header, shared caches must not keep them
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={max_age}"}
+
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def _get_quote(ticker: str) -> dict:
+    """
+    Return the stock info for the ticker, fetching it only when not cached.
+    Concurrent requests for the same ticker wait for a single fetch.
+    Args:
+        ticker (str): Stock ticker symbol.
+    Returns:
+        dict: Dictionary containing stock information.
+    """
+    info = Stock.cached_data(ticker)
+    if info is not None:
+        return info
+
+    lock = _quote_locks.get(ticker)
+    if lock is None:
+        lock = _quote_locks[ticker] = asyncio.Lock()
+
+    async with lock:
+        info = Stock.cached_data(ticker)
+        if info is not None:
+            return info
+
+        info = (await _get_shared_quotes([ticker])).get(ticker)
+        if info is not None:
+            return info
+
+        stock = Stock(symbol=ticker)
+        info = await _run_yf(stock.fetch_data)
+        await _share_quotes({ticker: info})
+        return info
+
+
+async def _get_shared_quotes(tickers: List[str]) -> Dict[str, dict]:
+    """
+    Read the quotes other workers stored in Redis, keeping them in memory too.
+    Args:
+        tickers (List[str]): Stock ticker symbols.
+    Returns:
+        Dict[str, dict]: Stock information by ticker, only for the ones found.
+    """
+    redis = get_redis()
+    if redis is None:
+        return {}
+
+    try:
+        values = await redis.mget([f"quote:{ticker}" for ticker in tickers])
+    except RedisError as e:
+        logger.warning("Redis unavailable for quote cache: %s", e)
+        return {}
+
+    quotes = {}
+    for ticker, value in zip(tickers, values):
+        if value is not None:
+            quotes[ticker] = orjson.loads(value)
+            Stock.cache_data(ticker, quotes[ticker])
+    return quotes
+
+
+async def _share_quotes(quotes: Dict[str, dict]) -> None:
+    """
+    Store freshly fetched quotes in Redis for the other workers.
+    Args:
+        quotes (Dict[str, dict]): Stock information by ticker.
+    """
+    redis = get_redis()
+    if redis is None or not quotes or not _QUOTE_CACHE_TTL:
+        return
+
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for ticker, info in quotes.items():
+                pipe.set(f"quote:{ticker}", orjson.dumps(info), ex=_QUOTE_CACHE_TTL)
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning("Redis unavailable for quote cache: %s", e)
+
+
+async def refresh_hot_quotes() -> None:
+    """
+    Re-fetch the quotes of the most requested tickers on a schedule, so requests
+    for them are always served from the cache. Runs until cancelled and returns
+    at once when HOT_TICKERS_REFRESH_SECONDS is 0.
+    """
+    if _HOT_TICKERS_REFRESH <= 0:
+        return
+
+    while True:
+        await asyncio.sleep(_HOT_TICKERS_REFRESH)
+
+        hot = [ticker for ticker, _ in _ticker_hits.most_common(_HOT_TICKERS_COUNT)]
+        for ticker, hits in list(_ticker_hits.items()):
+            if hits > 1:
+                _ticker_hits[ticker] = hits // 2
+            else:
+                del _ticker_hits[ticker]
+
+        if not hot:
+            continue
+        try:
+            # One failing ticker must not keep the others from being refreshed
+            fetched = await _run_yf(Stock.fetch_many, hot, True, True)
+            quotes = {}
+            for ticker, info in fetched.items():
+                if isinstance(info, Exception):
+                    logger.warning("Error refreshing hot quote %s: %s", ticker, info)
+                else:
+                    quotes[ticker] = info
+            await _share_quotes(quotes)
+            logger.debug("Refreshed %s hot quotes", len(quotes))
+        except Exception as e:
+            logger.warning("Error refreshing hot quotes: %s", e)
+
+
+async def _load_history(ticker: str, days: int, page: int) -> bytes:
+    """
+    Load one page of historical data from Redis or, on a miss, from yfinance.
+    The closing prices of the whole period are shared in Redis too, so a worker
+    serving another page of the same period slices them instead of downloading
+    them again. Both cache tiers are filled with the result.
+    Args:
+        ticker (str): Stock ticker symbol.
+        days (int): Number of days to fetch historical data for.
+        page (int): Page number for pagination.
+    Returns:
+        bytes: Paginated historical stock data, serialized as JSON.
+    """
+    key = (ticker, days, page)
+    redis = get_redis()
+    redis_key = f"history:{ticker}:{days}:{page}"
+    series_key = f"history_series:{ticker}:{days}"
+    # Only a period this worker downloads itself is worth sharing
+    share_series = Stock.cached_history(ticker, days) is None
+
+    if redis is not None:
+        try:
+            cached, series = await redis.mget(redis_key, series_key)
+        except RedisError as e:
+            logger.warning("Redis unavailable for history cache: %s", e)
+            cached = series = None
+        if cached is not None:
+            _history_cache.set(key, cached)
+            return cached
+        if share_series and series is not None:
+            Stock.cache_history(ticker, days, tuple(orjson.loads(series)))
+            share_series = False
+
+    stock = Stock(symbol=ticker)
+    history = await _run_yf(stock.fetch_historical_data, days, page)
+    history = history.model_dump_json().encode()
+    _history_cache.set(key, history)
+
+    if redis is not None and _HISTORY_CACHE_TTL:
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.set(redis_key, history, ex=_HISTORY_CACHE_TTL)
+                series = Stock.cached_history(ticker, days)
+                if share_series and series is not None:
+                    pipe.set(series_key, orjson.dumps(series), ex=_HISTORY_CACHE_TTL)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning("Redis unavailable for history cache: %s", e)
+
+    return history
+
+
+async def _get_history(ticker: str, days: int, page: int) -> bytes:
+    """
+    Fetch one page of historical data, served from memory when possible and
+    collapsing identical concurrent requests into a single load.
+    Args:
+        ticker (str): Stock ticker symbol.
+        days (int): Number of days to fetch historical data for.
+        page (int): Page number for pagination.
+    Returns:
+        bytes: Paginated historical stock data, serialized as JSON.
+    """
+    key = (ticker, days, page)
+    history = _history_cache.get(key)
+    if history is not None:
+        return history
+
+    future = _history_inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(_load_history(ticker, days, page))
+        _history_inflight[key] = future
+        future.add_done_callback(lambda _: _history_inflight.pop(key, None))
+
+    # Shielded so a cancelled client does not cancel the fetch for the others
+    return await asyncio.shield(future)
+
+
+@stock_router.get("/stock/{ticker}", dependencies=[Depends(local_limit("10/minute"))])
 @limiter.limit("10/minute")
-def get_stock(
+async def get_stock(
     request: Request,
     ticker: str = Path(
         ...,
@@ -23,19 +373,17 @@ def get_stock(
         pattern="^[A-Z0-9.]+$",
         description="Stock ticker symbol (e.g., AAPL, MSFT)",
     ),
-    authorization: str = Header(..., alias="Authorization"),
-) -> dict:
+    authorization: str = Depends(oauth2_scheme),
+    auth: Auth = Depends(get_auth),
+) -> Response:
     """_summary_
     Args:
         ticker (str): Stock ticker symbol.
     Returns:
-        dict: Dictionary containing stock information.
+        Response: Stock information as JSON, or 304 if unchanged.
 
     """
-    from backend.core.auth import Auth
-
-    auth = Auth()
-    if not auth.verify_token(access_token=authorization):
+    if not await run_in_threadpool(auth.verify_token, access_token=authorization):
         logger.warning("Invalid token.")
         raise HTTPException(
             status_code=401,
@@ -43,66 +391,114 @@ def get_stock(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    logger.info("Fetching stock info for %s", ticker)
     try:
-        if not ticker.isalnum() and ticker != ".":
-            raise HTTPException(status_code=400, detail="Invalid ticker format.")
+        info = await _get_quote(ticker)
+    except _UPSTREAM_ERRORS as e:
+        raise _upstream_error(e, ticker) from e
 
-        logger.info(f"Fetching stock info for {ticker}")
-        stock = Stock(symbol=ticker)
+    if not info or not info.get("success", False):
+        raise HTTPException(
+            status_code=404, detail="Stock ticker not found or invalid."
+        )
+
+    logger.debug("Fetched stock info for %s", ticker)
+    if _HOT_TICKERS_REFRESH > 0:
+        _ticker_hits[ticker] += 1
 
-        info = stock.fetch_data()
+    return _cacheable_response(request, orjson.dumps(info), _QUOTE_CACHE_TTL)
 
-        if info:
-            from backend.core.calculation import Calculation
 
-            calc = Calculation()
-            variation = calc.calculate_variation(info["data"])
-            info["data"]["Variation"] = variation
+@stock_router.get("/stocks", dependencies=[Depends(local_limit("10/minute"))])
+@limiter.limit("10/minute")
+async def get_stocks(
+    request: Request,
+    tickers: str = Query(
+        ...,
+        min_length=1,
+        description="Comma separated stock ticker symbols (e.g., AAPL,MSFT)",
+    ),
+    authorization: str = Depends(oauth2_scheme),
+    auth: Auth = Depends(get_auth),
+) -> Response:
+    """
+    Fetch stock information for several tickers in one request.
+    Args:
+        tickers (str): Comma separated stock ticker symbols.
+    Returns:
+        Response: Stock information by ticker as JSON, or 304 if unchanged.
+    """
+    if not await run_in_threadpool(auth.verify_token, access_token=authorization):
+        logger.warning("Invalid token.")
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    symbols = _parse_tickers(tickers)
 
-        if not info or not info.get("success", False):
-            raise HTTPException(
-                status_code=404, detail="Stock ticker not found or invalid."
-            )
+    data = {}
+    missing = []
+    for symbol in symbols:
+        info = Stock.cached_data(symbol)
+        if info is None:
+            missing.append(symbol)
+        else:
+            data[symbol] = info["data"]
 
-        logger.info(f"Fetched stock info for {ticker}")
+    try:
+        if missing:
+            shared = await _get_shared_quotes(missing)
+            missing = [symbol for symbol in missing if symbol not in shared]
+            for symbol, info in shared.items():
+                data[symbol] = info["data"]
 
-        return info
+        if missing:
+            logger.info("Fetching stock info for %s", ", ".join(missing))
+            fetched = await _run_yf(Stock.fetch_many, missing)
+            await _share_quotes(fetched)
+            for symbol, info in fetched.items():
+                data[symbol] = info["data"]
 
-    except Exception as e:
-        if "rate limit" in str(e).lower():
-            logger.warning(f"Rate limit exceeded.")
-            logger.error(f"Error fetching stock info for {ticker}: {str(e)}")
-            raise HTTPException(
-                status_code=429,
-                detail="Rate limit exceeded. Please try again later.",
-            )
+    except _UPSTREAM_ERRORS as e:
+        raise _upstream_error(e, tickers) from e
 
-        logger.error(f"Error fetching stock info for {ticker}: {str(e)}")
-        raise HTTPException(
-            status_code=500, detail="An error occurred while fetching stock info."
-        )
+    if _HOT_TICKERS_REFRESH > 0:
+        _ticker_hits.update(symbols)
+    body = orjson.dumps(
+        {
+            "success": True,
+            "data": {symbol: data[symbol] for symbol in symbols},
+            "message": "Stock info fetched successfully",
+        }
+    )
+    return _cacheable_response(request, body, _QUOTE_CACHE_TTL)
 
 
-@stock_router.get("/history", response_model=PaginatedHistory)
+@stock_router.get(
+    "/history",
+    response_model=PaginatedHistory,
+    dependencies=[Depends(local_limit("50/minute"))],
+)
 @limiter.limit("50/minute")
-def get_history(
+async def get_history(
     request: Request,
-    params: RequestHistoryParams = Depends(),
-    authorization: str = Header(..., alias="Authorization"),
-) -> PaginatedHistory:
+    params: Annotated[RequestHistoryParams, Query()],
+    authorization: str = Depends(oauth2_scheme),
+    auth: Auth = Depends(get_auth),
+) -> Response:
     """
     Fetch historical stock data for a given ticker symbol.
+    The page is sent as cached, already serialized JSON; response_model only
+    documents its shape.
     Args:
         params (RequestHistoryParams): Parameters for fetching historical data.
         token (str): Authentication token.
     Returns:
-        PaginatedHistory: Paginated historical stock data.
+        Response: Paginated historical stock data as JSON.
     """
-    from backend.core.auth import Auth
-
-    auth = Auth()
-
-    if not auth.verify_token(access_token=authorization):
+    if not await run_in_threadpool(auth.verify_token, access_token=authorization):
         logger.warning("Invalid token.")
         raise HTTPException(
             status_code=401,
@@ -110,25 +506,63 @@ def get_history(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    logger.info(
+        "Fetching historical data for %s over the last %s days (page %s)",
+        params.ticker,
+        params.days,
+        params.page,
+    )
     try:
-        logger.info(
-            f"Fetching historical data for {params.ticker} over the last {params.days} days (page {params.page})"
-        )
-        stock = Stock(symbol=params.ticker)
-        return stock.fetch_historical_data(params.days, params.page)
+        history = await _get_history(params.ticker, params.days, params.page)
+    except _UPSTREAM_ERRORS as e:
+        raise _upstream_error(e, params.ticker, 422, str(e)) from e
 
-    except ValueError as e:
-        logger.error(f"Validation error: {str(e)}")
-        raise HTTPException(status_code=422, detail=str(e))
+    return _cacheable_response(request, history, _HISTORY_CACHE_TTL)
 
-    except HTTPException as e:
-        logger.error(f"HTTP Error: {e.detail}")
-        raise e
 
-    except Exception as e:
-        logger.error(
-            f"Error fetching historical data for {params.ticker}: {traceback.format_exc()}"
-        )
+@stock_router.get("/history/batch", dependencies=[Depends(local_limit("10/minute"))])
+@limiter.limit("10/minute")
+async def get_history_batch(
+    request: Request,
+    params: Annotated[RequestBatchHistoryParams, Query()],
+    authorization: str = Depends(oauth2_scheme),
+    auth: Auth = Depends(get_auth),
+) -> Response:
+    """
+    Fetch one page of historical data for several tickers in one request.
+    Args:
+        params (RequestBatchHistoryParams): Tickers, period and page to fetch.
+    Returns:
+        Response: Paginated historical data by ticker as JSON, or 304 if unchanged.
+    """
+    if not await run_in_threadpool(auth.verify_token, access_token=authorization):
+        logger.warning("Invalid token.")
         raise HTTPException(
-            status_code=500, detail="An error occurred while fetching historical data."
+            status_code=401,
+            detail="Invalid token",
+            headers={"WWW-Authenticate": "Bearer"},
         )
+
+    symbols = _parse_tickers(params.tickers)
+
+    logger.info(
+        "Fetching historical data for %s over the last %s days (page %s)",
+        ", ".join(symbols),
+        params.days,
+        params.page,
+    )
+    try:
+        pages = await _run_yf(
+            Stock.fetch_many_history, symbols, params.days, params.page
+        )
+    except _UPSTREAM_ERRORS as e:
+        raise _upstream_error(e, params.tickers, 422, str(e)) from e
+
+    body = orjson.dumps(
+        {
+            "success": True,
+            "data": {symbol: page.model_dump() for symbol, page in pages.items()},
+            "message": "Historical data fetched successfully.",
+        }
+    )
+    return _cacheable_response(request, body, _HISTORY_CACHE_TTL)
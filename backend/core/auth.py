@@ -1,47 +1,80 @@
-import datetime
+import hashlib
+import hmac
 import logging
 import os
-from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
+import re
+import time
 
+import jwt
 from cryptography.fernet import Fernet, InvalidToken
 from dotenv import load_dotenv
 from fastapi import HTTPException, status
 from fastapi.security import APIKeyHeader
-from jose import JWTError, jwt
 from passlib.context import CryptContext
 
+from backend.core.cache import TTLCache
+from backend.core.database import Database
+
 logger = logging.getLogger(__name__)
 
 load_dotenv(override=True)
 
+# Shared Authorization header scheme, resolved once per request by every router
+oauth2_scheme = APIKeyHeader(name="Authorization", auto_error=True)
+
+# Shape of "[Bearer ]header.payload.signature", checked before any decoding
+_JWT_RE = re.compile(r"(?i:bearer )?([A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+)")
+_MAX_TOKEN_LENGTH = 4096
+
+_db = Database()
+
+# argon2id for new hashes, bcrypt kept to verify legacy ones. Built once, since
+# the context compiles its handlers on construction.
+_PWD_CTX = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__time_cost=int(os.getenv("ARGON2_TIME_COST", "2")),
+    argon2__memory_cost=int(os.getenv("ARGON2_MEMORY_COST", "19456")),
+    argon2__parallelism=1,
+    bcrypt__default_rounds=int(os.getenv("BCRYPT_ROUNDS", "12")),
+    bcrypt__ident="2b",
+    bcrypt__truncate_error=True,
+)
+
 
 class Auth:
     """
     Auth class to handle authentication-related tasks.
-    This class is a singleton to ensure that only one instance is created.
+    Use the shared auth_singleton instance instead of creating new ones.
     """
 
-    def __new__(cls):
-        if not hasattr(cls, "_instance"):
-            cls._instance = super(Auth, cls).__new__(cls)
-        return cls._instance
-
     def __init__(self):
-        if not hasattr(self, "_initialized"):
-            self._initialized = True
-            self._setup()
+        self._setup()
 
     def _setup(self):
 
         self._check_settings()
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-        self.oauth2_scheme = APIKeyHeader(name="Authorization", auto_error=False)
+        self.pwd_context = _PWD_CTX
+        self._check_hash_backends()
+        self.oauth2_scheme = oauth2_scheme
         self.access_token_expires_minutes = int(
             os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
         )
         self.secret_key = os.getenv("SECRET_KEY")
         self.algorithm = os.getenv("ALGORITHM", "HS256")
+        # Encoded once so every sign/verify reuses the same key bytes
+        self.jwt_key = self.secret_key.encode()
+        self._token_cache = TTLCache(
+            maxsize=int(os.getenv("TOKEN_CACHE_MAXSIZE", "4096")),
+            ttl=float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "60")),
+        )
+        self._password_cache = TTLCache(
+            maxsize=1024, ttl=float(os.getenv("PASSWORD_CACHE_TTL_SECONDS", "30"))
+        )
+        self._password_failure_ttl = float(
+            os.getenv("PASSWORD_FAILURE_CACHE_TTL_SECONDS", "5")
+        )
 
         # Validate SECRET_KEY
         if len(self.secret_key) < 32:
@@ -51,6 +84,26 @@ class Auth:
             logger.error("SECRET_KEY must contain alphanumeric characters.")
             raise ValueError("SECRET_KEY must contain alphanumeric characters.")
 
+        # Built once, Fernet holds no per-message state
+        self._fernet = Fernet(self.secret_key)
+        # Any ciphertext of a value stays valid, so recent ones are reused
+        self._encrypt_cache = TTLCache(maxsize=10000, ttl=60)
+
+    def _check_hash_backends(self):
+        """
+        Warn when passlib would hash with a slow fallback instead of the C backends.
+        """
+        expected = {"argon2": "argon2_cffi", "bcrypt": "bcrypt"}
+        for scheme, backend in expected.items():
+            current = self.pwd_context.handler(scheme).get_backend()
+            if current != backend:
+                logger.warning(
+                    "Password scheme %s is using the %s backend instead of %s",
+                    scheme,
+                    current,
+                    backend,
+                )
+
     def _check_settings(self):
         """
         Check if the required environment variables are set and validate the SECRET_KEY.
@@ -61,7 +114,7 @@ class Auth:
         required_vars = ["SECRET_KEY", "ALGORITHM", "ACCESS_TOKEN_EXPIRE_MINUTES"]
         missing_vars = [var for var in required_vars if not os.getenv(var)]
         if missing_vars:
-            logger.error(f"Missing environment variables: {', '.join(missing_vars)}")
+            logger.error("Missing environment variables: %s", ", ".join(missing_vars))
             raise ValueError(
                 f"Missing environment variables: {', '.join(missing_vars)}"
             )
@@ -69,6 +122,8 @@ class Auth:
     def _encrypt_data(self, data: str) -> str:
         """
         Encrypt sensitive data using Fernet symmetric encryption.
+        The ciphertext of a value is reused for a minute, so a user logging in again
+        does not pay for a new encryption.
         Args:
             data (str): The data to encrypt.
         Returns:
@@ -77,11 +132,12 @@ class Auth:
         if not self.secret_key:
             raise ValueError("SECRET_KEY is not set. Cannot encrypt data.")
 
-        f = Fernet(self.secret_key)
+        encrypted_data = self._encrypt_cache.get(data)
+        if encrypted_data is None:
+            encrypted_data = self._fernet.encrypt(data=data.encode()).decode()
+            self._encrypt_cache.set(data, encrypted_data)
 
-        encrypted_data = f.encrypt(data=data.encode())
-
-        return encrypted_data.decode()
+        return encrypted_data
 
     def _decrypt_data(self, encrypted_data: str) -> str:
         """
@@ -94,10 +150,8 @@ class Auth:
         if not self.secret_key:
             raise ValueError("SECRET_KEY is not set. Cannot decrypt data.")
 
-        f = Fernet(key=self.secret_key)
-
         try:
-            decrypted_data = f.decrypt(token=encrypted_data).decode()
+            decrypted_data = self._fernet.decrypt(token=encrypted_data).decode()
             return decrypted_data
 
         except InvalidToken:
@@ -107,8 +161,31 @@ class Auth:
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """
         Verify a plain password against its hashed version.
+        Results are cached for a short time so repeated logins do not pay the full
+        KDF cost again. Failures are kept only for a few seconds, enough to absorb
+        retries without letting a wrong password stick around.
         """
-        return self.pwd_context.verify(secret=plain_password, hash=hashed_password)
+        key = hmac.new(
+            self.jwt_key,
+            hashed_password.encode() + b"\x00" + plain_password.encode(),
+            hashlib.sha256,
+        ).digest()
+
+        verified = self._password_cache.get(key)
+        if verified is not None:
+            return verified
+
+        verified = self.pwd_context.verify(secret=plain_password, hash=hashed_password)
+        self._password_cache.set(
+            key, verified, ttl=None if verified else self._password_failure_ttl
+        )
+        return verified
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """
+        Check if a stored hash uses a deprecated scheme or outdated parameters.
+        """
+        return self.pwd_context.needs_update(hash=hashed_password)
 
     def get_password_hash(self, password: str) -> str:
         """
@@ -116,6 +193,19 @@ class Auth:
         """
         return self.pwd_context.hash(secret=password)
 
+    def session_id(self, password_hash: str) -> str:
+        """
+        Derive the token session id from the user's current password hash.
+        Changing the password changes the id, which invalidates issued tokens.
+        Args:
+            password_hash (str): The stored password hash of the user.
+        Returns:
+            str: Hex encoded HMAC-SHA256 of the hash under the secret key.
+        """
+        return hmac.new(
+            self.jwt_key, password_hash.encode(), hashlib.sha256
+        ).hexdigest()
+
     def create_access_token(
         self, data: dict, encrypt_sensitive_data: bool = False
     ) -> str:
@@ -134,63 +224,91 @@ class Auth:
                 if key in ["email", "password", "password_hash"]:
                     to_encode[key] = self._encrypt_data(value)
 
-        expire = datetime.now(tz=ZoneInfo("UTC")) + timedelta(
-            minutes=self.access_token_expires_minutes
-        )
-        to_encode.update({"exp": expire.timestamp()})
-        logger.debug(f"Creating access token with data: {to_encode}")
+        expire = time.time() + self.access_token_expires_minutes * 60
+        to_encode.update({"exp": expire})
+        logger.debug("Creating access token expiring at %s", expire)
 
-        return jwt.encode(
-            claims=to_encode, key=self.secret_key, algorithm=self.algorithm
-        )
+        return jwt.encode(payload=to_encode, key=self.jwt_key, algorithm=self.algorithm)
 
     def verify_token(self, access_token: str) -> dict:
         """
         Verify a JWT access token and return the payload.
+        Valid tokens are cached until they expire (bounded by TOKEN_CACHE_TTL_SECONDS),
+        so repeated requests with the same token skip decoding and the database lookup.
+        Malformed values are rejected before touching the cache or the JWT library.
         Args:
             access_token (str): The JWT token to verify.
         Returns:
             dict: The decoded payload if the token is valid.
         """
-        if access_token.lower().startswith("bearer "):
-            access_token = access_token.split(" ")[1]
+        match = (
+            _JWT_RE.fullmatch(access_token)
+            if len(access_token) <= _MAX_TOKEN_LENGTH
+            else None
+        )
+        if match is None:
+            logger.debug("Rejected malformed Authorization header")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid access token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        access_token = match.group(1)
+
+        # Keyed by digest so long tokens are not kept in memory twice
+        key = hashlib.sha256(access_token.encode()).digest()
+        payload = self._token_cache.get(key)
+        if payload is not None and payload["exp"] > time.time():
+            return payload
+
+        payload = self._verify_token(access_token)
+        self._token_cache.set(
+            key,
+            payload,
+            ttl=min(self._token_cache.ttl, payload["exp"] - time.time()),
+        )
+        return payload
 
+    def _verify_token(self, access_token: str) -> dict:
+        """
+        Decode the JWT access token and check its user against the database.
+        Args:
+            access_token (str): The JWT token without the Bearer prefix.
+        Returns:
+            dict: The decoded payload if the token is valid.
+        """
         try:
+            # PyJWT checks the signature and the expiry, and fails on missing claims
             payload = jwt.decode(
-                access_token, self.secret_key, algorithms=[self.algorithm]
+                access_token,
+                self.jwt_key,
+                algorithms=[self.algorithm],
+                options={"require": ["exp", "email"]},
             )
 
-            # Check expiration
-            if datetime.now(tz=ZoneInfo("UTC")) >= datetime.fromtimestamp(
-                payload["exp"], tz=ZoneInfo("UTC")
-            ):
-                logger.error("Token has expired")
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token has expired",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-
-            if "email" in payload:
-                email = self._decrypt_data(encrypted_data=payload["email"])
-
-            if "password" in payload:
-                password_token = self._decrypt_data(encrypted_data=payload["password"])
+            email = self._decrypt_data(encrypted_data=payload["email"])
+            session_id = payload.get("sid")
+            # Tokens issued before "sid" carry the encrypted password hash instead
+            password_token = (
+                None
+                if session_id or "password" not in payload
+                else self._decrypt_data(encrypted_data=payload["password"])
+            )
 
-            if not email or not password_token:
-                logger.error("Token does not contain email or password")
+            if not email or not (session_id or password_token):
+                logger.error("Token does not contain email or session")
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Invalid token payload",
                     headers={"WWW-Authenticate": "Bearer"},
                 )
 
-            from backend.core.database import Database
-
-            db_instance = Database()
-            user_db = db_instance.get_user_from_db(email)
+            user_db = _db.get_user_session(email, session_id=self.session_id)
 
-            if not user_db or password_token != user_db.get("password_hash"):
+            if not user_db.get("success") or not hmac.compare_digest(
+                (session_id or self.session_id(password_token)).encode(),
+                user_db["session_id"].encode(),
+            ):
                 logger.error("Invalid username or password in token")
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -198,7 +316,7 @@ class Auth:
                     headers={"WWW-Authenticate": "Bearer"},
                 )
 
-            logger.info("Token verified successfully and user authenticated.")
+            logger.debug("Token verified successfully and user authenticated.")
             return payload
 
         except jwt.ExpiredSignatureError:
@@ -208,17 +326,25 @@ class Auth:
                 detail="Token has expired",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        except jwt.JWTClaimsError:
+        except (
+            jwt.ImmatureSignatureError,
+            jwt.InvalidIssuedAtError,
+            jwt.MissingRequiredClaimError,
+        ):
             logger.error("Invalid token claims")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token claims",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        except JWTError:
+        except jwt.InvalidTokenError:
             logger.error("Token verification failed")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid access token",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+
+
+# Shared instance, its caches only help if every caller uses the same one
+auth_singleton = Auth()
@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Hashable, Optional
+
+from redis.asyncio import Redis
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a time-to-live.
+    Used to keep the result of expensive operations in memory between requests.
+    A ttl of zero or less disables the cache: nothing is stored.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be greater than zero")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return the cached value for the key, or default if missing or expired.
+        """
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value in the cache.
+        Args:
+            key (Hashable): Cache key.
+            value (Any): Value to store.
+            ttl (float, optional): Time-to-live in seconds, defaults to the cache ttl.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Remove the key from the cache and return its value.
+        """
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+@lru_cache(maxsize=1)
+def get_redis() -> Optional[Redis]:
+    """
+    Shared Redis client used as the second cache tier between workers.
+    Returns:
+        Redis: The client, or None when REDIS_URL is not configured.
+    """
+    url = os.getenv("REDIS_URL")
+    if not url:
+        return None
+    return Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+
+async def close_redis() -> None:
+    """
+    Close the shared Redis client, if one was created.
+    """
+    redis = get_redis()
+    if redis is not None:
+        await redis.aclose()
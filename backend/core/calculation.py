@@ -1,24 +1,96 @@
 import logging
+from functools import lru_cache
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
 
-class Calculation:
+_MONTH_KEYS = (
+    "Month",
+    "Interest Amount",
+    "Amount Invested",
+    "Accumulated Interest",
+    "Accumulated Total",
+)
+
+
+@lru_cache(maxsize=128)
+def _compound_columns(
+    initial_value: float,
+    monthly_contribution: float,
+    monthly_rate: float,
+    number_months: int,
+) -> tuple:
     """
-    Calculation class to handle financial calculations.
+    Compound the investment month by month using the closed form of the series.
+    The contribution is added from the second month on, so the total at month k is
+    initial_value * g**k + monthly_contribution * (g**k - g) / monthly_rate,
+    with g = 1 + monthly_rate.
+    Returns:
+        tuple: Total value, amount invested, total interest and the monthly breakdown
+            as one list per field.
+    """
+    growth_factor = 1 + monthly_rate
+    month = np.arange(1, number_months + 1)
+    # g**k - 1 and g**k - g through expm1/log1p, so tiny rates keep their precision
+    log_growth = np.log1p(monthly_rate)
+    growth_minus_one = np.expm1(month * log_growth)
+    growth_minus_factor = growth_factor * np.expm1((month - 1) * log_growth)
+
+    accumulated_total = (
+        initial_value * (growth_minus_one + 1)
+        + monthly_contribution * growth_minus_factor / monthly_rate
+    )
+    amount_invested = initial_value + monthly_contribution * (month - 1)
+    interest_amount = accumulated_total * monthly_rate / growth_factor
+    accumulated_interest = accumulated_total - amount_invested
+
+    columns = dict(
+        zip(
+            _MONTH_KEYS,
+            (
+                month.tolist(),
+                interest_amount.tolist(),
+                amount_invested.tolist(),
+                accumulated_interest.tolist(),
+                accumulated_total.tolist(),
+            ),
+        )
+    )
+
+    return (
+        columns["Accumulated Total"][-1],
+        columns["Amount Invested"][-1],
+        columns["Accumulated Interest"][-1],
+        columns,
+    )
+
+
+@lru_cache(maxsize=128)
+def _compound_totals(
+    initial_value: float,
+    monthly_contribution: float,
+    monthly_rate: float,
+    number_months: int,
+) -> tuple:
     """
+    Same as _compound_columns, with the monthly breakdown as one dict per month.
+    Returns:
+        tuple: Total value, amount invested, total interest and the monthly breakdown.
+    """
+    total, invested, interest, columns = _compound_columns(
+        initial_value, monthly_contribution, monthly_rate, number_months
+    )
+    months = [dict(zip(_MONTH_KEYS, row)) for row in zip(*columns.values())]
+
+    return total, invested, interest, months
 
-    def __new__(cls, *args, **kwargs):
-        """
-        Singleton pattern to ensure only one instance of Calculation exists.
-        """
-        if not hasattr(cls, "_instance"):
-            cls._instance = super(Calculation, cls).__new__(cls)
-        return cls._instance
 
-    def __init__(self):
-        if not hasattr(self, "_initialized"):
-            self._initialized = True
+class Calculation:
+    """
+    Calculation class to handle financial calculations.
+    """
 
     def calculate_monthly_rate(self, annual_rate: float) -> float:
         """_summary_
@@ -36,14 +108,19 @@ class Calculation:
         monthly_contribution: float,
         annual_interest: float,
         number_months: int,
+        columnar: bool = False,
     ) -> float:
         """_summary_
+        Results are memoized, so repeated submissions of the same inputs are served
+        from memory. The returned months are shared and must not be mutated.
 
         Args:
             param: initial_value (float): Initial value for the calculation.
             param: monthly_contribution (float): Monthly contribution amount.
             param: annual_interest (float): Annual interest rate as a percentage.
             param: months (int): Number of months for the calculation.
+            param: columnar (bool): Return the months as one list per field instead
+                of one dict per month.
 
         Raises:
             ValueError: If the annual interest rate is less than or equal to zero.
@@ -56,68 +133,19 @@ class Calculation:
             if annual_interest <= 0:
                 raise ValueError("Interest rate must be greater than zero")
 
-            monthly_rate = self.calculate_monthly_rate(annual_interest)
-
-            total_value = initial_value
-            amount_invested = initial_value
-            total_interest = 0
-            months = []
-
-            for i in range(1, number_months + 1):
-
-                if i > 1:
-                    total_value += monthly_contribution
-                    amount_invested += monthly_contribution
-
-                fees = total_value * monthly_rate
-                total_value += fees
-                total_interest += fees
+            compound = _compound_columns if columnar else _compound_totals
+            result = compound(
+                initial_value,
+                monthly_contribution,
+                self.calculate_monthly_rate(annual_interest),
+                number_months,
+            )
 
-                months.append(
-                    {
-                        "Month": i,
-                        "Interest Amount": fees,
-                        "Amount Invested": amount_invested,
-                        "Accumulated Interest": total_interest,
-                        "Accumulated Total": total_value,
-                    }
-                )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Totals cache: %s", compound.cache_info())
 
-            return total_value, amount_invested, total_interest, months
+            return result
 
         except Exception as e:
-            logger.error(f"Error in calculate_interest: {str(e)}")
+            logger.error("Error in calculate_interest: %s", e)
             raise
-
-    def calculate_variation(self, info: dict):
-        """_summary_
-        Args:
-            info (dict): Dictionary containing stock information.
-                Expected keys: 'previousClose' and 'regularMarketPrice'.
-        Returns:
-            float: Percentage variation between previous close and current market price.
-        """
-        if not isinstance(info, dict):
-            raise ValueError("info must be a dictionary")
-
-        try:
-            price_before = info.get("Previous Close")
-            actual_price = info.get("Regular Market Price")
-            short_name = info.get("Name", "Unknown")
-            logger.info(
-                f"Calculating variation for {short_name}. Previous Close: {price_before}, Regular Market Price: {actual_price}"
-            )
-
-            if price_before and actual_price:
-                variation = ((actual_price - price_before) / price_before) * 100
-                logger.info(f"Variation calculated: {variation:.2f}%")
-                return variation
-        except KeyError as e:
-            logger.error(f"Key error: {str(e)}")
-            raise ValueError(f"Missing key in info dictionary: {str(e)}")
-
-        except Exception as e:
-            logger.error(f"Error calculating variation: {str(e)}")
-            raise ValueError(f"Error calculating variation: {str(e)}")
-
-        return None
@@ -1,12 +1,17 @@
 import os
 
-import requests
+import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
 
+RECAPTCHA_URL = "https://www.google.com/recaptcha/api/siteverify"
 
-def verify_recaptcha(response_token: str) -> bool:
+# Shared client so verifications reuse the same connection to Google
+_client = httpx.AsyncClient(http2=True, timeout=5.0)
+
+
+async def verify_recaptcha(response_token: str) -> bool:
     """
     Verify the CAPTCHA token using Google's reCAPTCHA API.
     Expects RECAPTCHA_SECRET_KEY in the environment variables.
@@ -15,11 +20,17 @@ def verify_recaptcha(response_token: str) -> bool:
     if not secret:
         raise ValueError("Missing RECAPTCHA_SECRET_KEY in environment variables.")
 
-    url = "https://www.google.com/recaptcha/api/siteverify"
     payload = {
         "secret": secret,
         "response": response_token,
     }
-    response = requests.post(url, data=payload)
+    response = await _client.post(RECAPTCHA_URL, data=payload)
     result = response.json()
     return result.get("success", False)
+
+
+async def close_client() -> None:
+    """
+    Close the shared reCAPTCHA HTTP client.
+    """
+    await _client.aclose()
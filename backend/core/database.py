@@ -1,13 +1,136 @@
 import logging
+import os
+import select
 import textwrap
-from typing import Any, Dict
+import threading
+from typing import Any, Callable, Dict
 
 from fastapi import HTTPException, status
 
 from backend import db_connection
+from backend.core.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+_SQL_CREATE_TABLE = textwrap.dedent(
+    """\
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password_hash VARCHAR(512) NOT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        );
+        
+        -- Create trigger to update the updated_at column on row update
+        CREATE OR REPLACE FUNCTION update_modified_column()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.updated_at = NOW();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        
+        DROP TRIGGER IF EXISTS update_users_updated_at ON users;
+        CREATE TRIGGER update_users_updated_at
+        BEFORE UPDATE ON users
+        FOR EACH ROW
+        EXECUTE PROCEDURE update_modified_column();
+    """
+)
+
+# True once the users table and its trigger exist
+_SQL_SCHEMA_READY = textwrap.dedent(
+    """\
+        SELECT EXISTS (
+            SELECT 1
+            FROM pg_trigger
+            WHERE tgname = 'update_users_updated_at'
+              AND tgrelid = to_regclass('public.users')
+        );"""
+)
+
+_SQL_GET_USER = textwrap.dedent(
+    """\
+        SELECT 
+            email, 
+            password_hash, 
+            is_active 
+        FROM postgres.public.users 
+        WHERE email= %s LIMIT 1;"""
+)
+
+_SQL_INSERT_USER = textwrap.dedent(
+    """\
+            INSERT INTO users (
+                email,
+                password_hash)
+            VALUES 
+                (%s, %s) 
+            ON CONFLICT (email) DO NOTHING
+        """
+)
+
+_SQL_UPDATE_PASSWORD_HASH = "UPDATE users SET password_hash = %s WHERE email = %s"
+
+# Sent in the transaction that changes a user, delivered to every worker on commit
+_SQL_NOTIFY_USER_CHANGED = "SELECT pg_notify('user_changed', %s)"
+
+# Set once the schema is known to exist, later calls skip the database
+_schema_ready = False
+
+# Users looked up by email for token checks, kept briefly so repeated requests
+# skip the database. Entries are dropped when any worker changes the user.
+_USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+_user_cache = TTLCache(maxsize=4096, ttl=_USER_CACHE_TTL)
+
+
+def _listen_user_changes(stop: threading.Event) -> None:
+    """
+    Drop the cached users other workers announce as changed on the user_changed
+    channel. Reconnects after errors until stop is set.
+    """
+    while not stop.is_set():
+        conn = None
+        try:
+            conn = db_connection.connect_direct()
+            conn.autocommit = True
+            conn.cursor().execute("LISTEN user_changed")
+            # Changes made while not listening were missed
+            _user_cache.clear()
+
+            while not stop.is_set():
+                if select.select([conn], [], [], 5)[0]:
+                    conn.poll()
+                    while conn.notifies:
+                        _user_cache.pop(conn.notifies.pop(0).payload)
+
+        except Exception as e:
+            logger.warning("User cache listener error: %s", e)
+            _user_cache.clear()
+            stop.wait(5)
+
+        finally:
+            if conn is not None and not conn.closed:
+                conn.close()
+
+
+def start_user_cache_listener() -> threading.Event:
+    """
+    Start listening for user changes made by other workers in a daemon thread.
+    Returns:
+        threading.Event: Set it to stop the listener.
+    """
+    stop = threading.Event()
+    threading.Thread(
+        target=_listen_user_changes,
+        args=(stop,),
+        name="user-cache-listener",
+        daemon=True,
+    ).start()
+    return stop
+
 
 class Database:
     """
@@ -17,42 +140,21 @@ class Database:
     def create_table(self) -> Dict[str, Any]:
         """
         Create or verify the existence of the 'users' table in the database.
-        This function ensures that the table has the necessary columns and constraints
+        This function ensures that the table has the necessary columns and constraints.
+        The DDL script only runs when the table or its trigger is missing, so an
+        existing schema is not locked by DROP/CREATE TRIGGER on every startup.
 
         Returns:
             Dict: Result of the operation, indicating success or failure.
         """
-        sql_query = textwrap.dedent(
-            """\
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                password_hash VARCHAR(512) NOT NULL,
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT NOW(),
-                updated_at TIMESTAMP DEFAULT NOW(),
-                
-            );
-            
-            -- Create trigger to update the updated_at column on row update
-            CREATE OR REPLACE FUNCTION update_modified_column()
-            RETURNS TRIGGER AS $$
-            BEGIN
-                NEW.updated_at = NOW();
-                RETURN NEW;
-            END;
-            $$ LANGUAGE plpgsql;
-            
-            DROP TRIGGER IF EXISTS update_users_updated_at ON users;
-            CREATE TRIGGER update_users_updated_at
-            BEFORE UPDATE ON users
-            FOR EACH ROW
-            EXECUTE PROCEDURE update_modified_column();
-        """
-        )
+        global _schema_ready
 
         try:
-            db_connection.execute(sql_query)
+            if not _schema_ready:
+                ready = db_connection.execute(_SQL_SCHEMA_READY, fetch="one")[0]
+                if not ready:
+                    db_connection.run_script(_SQL_CREATE_TABLE)
+                _schema_ready = True
 
             logger.info("Table created/verified successfully")
             return {
@@ -61,7 +163,7 @@ class Database:
             }
 
         except ValueError as ve:
-            logger.error(f"Value error: {str(ve)}")
+            logger.error("Value error: %s", ve)
             raise HTTPException(
                 status_code=500, detail="Internal server error during database setup"
             )
@@ -102,54 +204,47 @@ class Database:
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        sql_query = textwrap.dedent(
-            """\
-            SELECT 
-                email, 
-                password_hash, 
-                is_active 
-            FROM postgres.public.users 
-            WHERE email= %s LIMIT 1;"""
-        )
-
         try:
-            logger.info(f"Fetching user with email: {email}")
+            logger.debug("Fetching user with email: %s", email)
 
-            result = db_connection.execute(
-                query=sql_query,
+            data_user = db_connection.execute(
+                query=_SQL_GET_USER,
                 params=(email,),
+                prepare=True,
+                fetch="one",
             )
-            if result:
-                data_user = result[0]
-                return {
+            if data_user:
+                user = {
                     "success": True,
                     "email": data_user[0],
                     "password_hash": data_user[1],
                     "is_active": data_user[2],
                 }
             else:
-                logger.info(f"No user found with email: {email}")
-                return {
+                logger.info("No user found with email: %s", email)
+                user = {
                     "success": False,
                     "message": "User not found",
                 }
 
+            return user
+
         except ValueError as ve:
-            logger.error(f"Value error: {str(ve)}")
+            logger.error("Value error: %s", ve)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Invalid input data, {str(ve)}",
                 headers={"WWW-Authenticate": "Bearer"},
             )
         except TypeError as te:
-            logger.error(f"Type error: {str(te)}")
+            logger.error("Type error: %s", te)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Invalid input data, {str(te)}",
                 headers={"WWW-Authenticate": "Bearer"},
             )
         except Exception as e:
-            logger.error(f"Error fetching user from database: {e}")
+            logger.error("Error fetching user from database: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error on consulting user in database",
@@ -157,11 +252,41 @@ class Database:
             )
 
         finally:
-            logger.info("Finished fetching user from database")
+            logger.debug("Finished fetching user from database")
+
+    def get_user_session(self, email: str, session_id: Callable[[str], str]) -> dict:
+        """
+        Look up a user for token verification, served from a short-lived cache.
+        The password hash is never cached: the entry keeps session_id(password_hash)
+        in its place, an HMAC that only the caller's key can reproduce.
+
+        Args:
+                - email (str): User email from the token.
+                - session_id (Callable[[str], str]): Derives the session id from
+                  the stored password hash.
+        Returns:
+                - Same as get_user_from_db, with session_id instead of password_hash.
+        """
+        cached = _user_cache.get(email)
+        if cached is not None:
+            return dict(cached)
+
+        user = self.get_user_from_db(email)
+        if user.get("success"):
+            user["session_id"] = session_id(user.pop("password_hash"))
+
+        _user_cache.set(email, user, ttl=_USER_CACHE_TTL)
+        return dict(user)
 
     def user_register(self, email: str, password: str) -> dict:
         """
         Register a new user in the database.
+        The existence check is done by the UNIQUE constraint on email: a conflicting
+        INSERT affects no rows, so no SELECT is needed before registering.
+
+        Returns:
+            - success (bool): False if a user with this email already exists.
+            - message (str): Result of the operation.
         """
         if not email or not password:
             logger.error("Email and password are required for registration")
@@ -170,36 +295,37 @@ class Database:
                 detail="Email and password are required",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        from backend.core.auth import Auth
+        from backend.core.auth import auth_singleton
 
-        auth = Auth()
-        hashed_password = auth.get_password_hash(password)
+        hashed_password = auth_singleton.get_password_hash(password)
 
-        sql_query = textwrap.dedent(
-            """\
-                INSERT INTO users (
-                    email,
-                    password_hash)
-                VALUES 
-                    (%s, %s) 
-                RETURNING id
-            """
-        )
         try:
-            db_connection.execute(
-                query=sql_query,
+            inserted_rows = db_connection.execute(
+                query=_SQL_INSERT_USER,
                 params=(
                     email,
                     hashed_password,
                 ),
             )
+            db_connection.execute(_SQL_NOTIFY_USER_CHANGED, (email,))
+            db_connection.commit()
+            _user_cache.pop(email)
+
+            if inserted_rows == 0:
+                logger.info("User already exists: %s", email)
+                return {
+                    "success": False,
+                    "message": "User already exists",
+                }
+
             return {
                 "success": True,
                 "message": f"User registered successfully",
             }
 
         except ValueError as ve:
-            logger.error(f"Value error: {str(ve)}")
+            db_connection.rollback()
+            logger.error("Value error: %s", ve)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid input data",
@@ -207,7 +333,29 @@ class Database:
             )
 
         except Exception as e:
-            logger.error(f"Error registering user: {e}")
+            db_connection.rollback()
+            logger.error("Error registering user: %s", e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Internal server error",
+            )
+
+    def update_password_hash(self, email: str, password_hash: str) -> dict:
+        """
+        Replace the stored password hash of a user.
+        Used to upgrade legacy hashes after a successful login.
+        """
+        try:
+            with db_connection.transaction():
+                db_connection.execute(
+                    query=_SQL_UPDATE_PASSWORD_HASH, params=(password_hash, email)
+                )
+                db_connection.execute(_SQL_NOTIFY_USER_CHANGED, (email,))
+            _user_cache.pop(email)
+            return {"success": True, "message": "Password hash updated"}
+
+        except Exception as e:
+            logger.error("Error updating password hash: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Internal server error",
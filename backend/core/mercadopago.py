@@ -1,14 +1,118 @@
 import logging
 import os
+import threading
 from typing import Dict, List
 
 import mercadopago as mp
+import requests
+from mercadopago.http import HttpClient
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 
 from backend import db_connection
 from backend.core.stock import Stock
+from backend.payment_model import PaymentItem
 
 logger = logging.getLogger(__name__)
 
+MP_HTTP_POOL_SIZE = int(os.getenv("MP_HTTP_POOL_SIZE", "10"))
+
+
+def _fetch_prices(symbols: List[str]) -> Dict[str, float]:
+    """
+    Fetch the current price of every symbol concurrently.
+    Args:
+        symbols (List[str]): Stock symbols, duplicates are fetched once.
+    Returns:
+        Dict[str, float]: Current price by symbol.
+    Raises:
+        ValueError: If the price of any symbol cannot be fetched.
+    """
+    prices = {}
+    for symbol, stock_data in Stock.fetch_many(symbols).items():
+        if not stock_data["success"]:
+            logger.error("Could not fetch data for stock %s", symbol)
+            raise ValueError(f"Failed to fetch price for: {symbol}")
+        prices[symbol] = stock_data["data"]["Actual Price"]
+    return prices
+
+
+_SQL_UPDATE_TRANSACTIONS = """
+UPDATE transactions
+SET status = %s, mp_payment_id = %s
+WHERE id = ANY(%s)
+"""
+
+# Marks the transactions paid, credits the wallets and debits the balances at once
+_SQL_APPROVE_TRANSACTIONS = """
+WITH updated AS (
+    UPDATE transactions
+    SET status = %s, mp_payment_id = %s
+    WHERE id = ANY(%s)
+    RETURNING user_id, stock_symbol, quantity, price
+),
+wallet_update AS (
+    INSERT INTO wallet (user_id, stock_symbol, quantity)
+    SELECT user_id, stock_symbol, SUM(quantity)
+    FROM updated
+    GROUP BY user_id, stock_symbol
+    ON CONFLICT (user_id, stock_symbol)
+    DO UPDATE SET quantity = wallet.quantity + EXCLUDED.quantity
+),
+balance_update AS (
+    UPDATE users
+    SET balance = users.balance - totals.amount
+    FROM (
+        SELECT user_id, SUM(price * quantity) AS amount
+        FROM updated
+        GROUP BY user_id
+    ) AS totals
+    WHERE users.id = totals.user_id
+)
+SELECT COUNT(*) FROM updated
+"""
+
+
+class _SessionHttpClient(HttpClient):
+    """
+    MercadoPago HTTP client that keeps its connections alive between calls.
+    The SDK default opens a new requests.Session (and TLS handshake) per request.
+    """
+
+    def __init__(self, pool_size: int = MP_HTTP_POOL_SIZE):
+        self._pool_size = pool_size
+        self._sessions: Dict[int, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def _session(self, maxretries) -> requests.Session:
+        with self._lock:
+            session = self._sessions.get(maxretries)
+            if session is None:
+                retry_strategy = Retry(
+                    total=maxretries, status_forcelist=[429, 500, 502, 503, 504]
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=self._pool_size,
+                    pool_maxsize=self._pool_size,
+                    max_retries=retry_strategy,
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                self._sessions[maxretries] = session
+            return session
+
+    def request(self, method, url, maxretries=None, **kwargs):
+        api_result = self._session(maxretries).request(method, url, **kwargs)
+        response = {"status": api_result.status_code, "response": None}
+
+        if api_result.status_code != 204 and api_result.content:
+            try:
+                response["response"] = api_result.json()
+            except ValueError as e:
+                logger.warning("Failed to parse MercadoPago response: %s", e)
+
+        return response
+
 
 class PaymentProcessor:
     """Class to handle payment processing using MercadoPago SDK."""
@@ -17,15 +121,15 @@ class PaymentProcessor:
         self.access_token = os.getenv("MP_TEST_TOKEN")
         if not self.access_token:
             raise ValueError("Access token not configured.")
-        self.sdk = mp.SDK(self.access_token)
+        self.sdk = mp.SDK(self.access_token, http_client=_SessionHttpClient())
 
-    def create_payment_preference(self, user_id: int, items: List[dict]) -> dict:
+    def create_payment_preference(self, user_id: int, items: List[PaymentItem]) -> dict:
         """
         Creates a payment preference and registers pending transaction(s).
 
         Args:
             user_id: ID of the user making the purchase
-            items: List of items (stock_symbol, quantity)
+            items: List of validated payment items (symbol, quantity)
 
         Returns:
             Dict containing payment_url and transaction_ids
@@ -33,54 +137,44 @@ class PaymentProcessor:
         # Get user email
         email_payer = db_connection.get_email_user_by_id(user_id)
         if not email_payer:
-            logger.error(f"User with ID {user_id} not found.")
+            logger.error("User with ID %s not found.", user_id)
             raise ValueError(f"User with ID {user_id} not found.")
 
-        mp_items = []
-        transaction_ids = []
-
         try:
-            for item in items:
-                stock = Stock(item["symbol"])
-                stock_data = stock.fetch_data()
-                if not stock_data["success"]:
-                    logger.error(f"Could not fetch data for stock {item['symbol']}")
-                    raise ValueError(f"Failed to fetch price for: {item['symbol']}")
-
-                current_price = stock_data["data"]["Actual Price"]
-                total_amount = current_price * item["quantity"]
-
-                # Insert transaction record
-                insert_query = """
-                    INSERT INTO transactions 
-                        (user_id, stock_symbol, quantity, price,type, status)
-                    VALUES
-                        (%s, %s, %s, %s, %s, %s)
-                    RETURNING id;
-                """
-
-                result = db_connection.execute(
-                    query=insert_query,
-                    params=(
+            prices = _fetch_prices([item.symbol for item in items])
+
+            # Insert every transaction record in one round trip
+            insert_query = """
+                INSERT INTO transactions
+                    (user_id, stock_symbol, quantity, price, type, status)
+                VALUES %s
+                RETURNING id;
+            """
+            rows = db_connection.insert_many(
+                query=insert_query,
+                rows=[
+                    (
                         user_id,
-                        item["symbol"],
-                        item["quantity"],
-                        current_price,
+                        item.symbol,
+                        item.quantity,
+                        prices[item.symbol],
                         "buy",
                         "pending",
-                    ),
-                )
-                transaction_id = result[0] if isinstance(result, tuple) else result
-                transaction_ids.append(transaction_id)
-
-                mp_items.append(
-                    {
-                        "title": f"{item['quantity']} x {item['symbol']} shares",
-                        "quantity": 1,
-                        "unit_price": float(total_amount),
-                        "currency_id": "BRL",
-                    }
-                )
+                    )
+                    for item in items
+                ],
+            )
+            transaction_ids = [row[0] for row in rows]
+
+            mp_items = [
+                {
+                    "title": f"{item.quantity} x {item.symbol} shares",
+                    "quantity": 1,
+                    "unit_price": float(prices[item.symbol] * item.quantity),
+                    "currency_id": "BRL",
+                }
+                for item in items
+            ]
 
             preference_data = {
                 "items": mp_items,
@@ -107,67 +201,43 @@ class PaymentProcessor:
 
         except Exception as e:
             db_connection.rollback()
-            logger.error(f"Error creating payment preference: {e}")
+            logger.error("Error creating payment preference: %s", e)
             raise ValueError(f"Failed to create payment preference: {str(e)}") from e
 
     def process_webhook(self, payload: dict) -> bool:
         """
         Process webhook notification from Mercado Pago.
-        Updates transaction status and user's wallet for approved payments.
+        Updates transaction status and user's wallet for approved payments,
+        all transactions of the payment in a single statement.
         """
         try:
             payment_id = payload["data"]["id"]
             payment_status = payload["data"]["status"]
-            transaction_ids = payload["external_reference"].split(",")
-
-            for transaction_id in transaction_ids:
-                self._update_transaction(transaction_id, payment_id, payment_status)
+            transaction_ids = list(
+                dict.fromkeys(int(t) for t in payload["external_reference"].split(","))
+            )
 
+            with db_connection.transaction():
                 if payment_status == "approved":
-                    self._update_user_wallet(transaction_id)
+                    result = db_connection.execute(
+                        _SQL_APPROVE_TRANSACTIONS,
+                        (payment_status, payment_id, transaction_ids),
+                        prepare=True,
+                    )
+                    updated = result[0][0] if result else 0
+                    if updated != len(transaction_ids):
+                        raise ValueError(
+                            f"Transactions not found: {payload['external_reference']}"
+                        )
+                else:
+                    db_connection.execute(
+                        _SQL_UPDATE_TRANSACTIONS,
+                        (payment_status, payment_id, transaction_ids),
+                        prepare=True,
+                    )
 
-            db_connection.commit()
             return True
 
         except Exception as e:
-            db_connection.rollback()
-            logger.error(f"Error processing webhook: {e}")
+            logger.error("Error processing webhook: %s", e)
             raise
-
-    def _update_transaction(self, transaction_id: int, payment_id: str, status: str):
-        sql = """
-        UPDATE transactions 
-        SET status = %s, mp_payment_id = %s 
-        WHERE id = %s
-        """
-        db_connection.execute(sql, (status, payment_id, transaction_id))
-
-    def _update_user_wallet(self, transaction_id: int):
-        sql = """
-        SELECT user_id, stock_symbol, quantity, price 
-        FROM transactions 
-        WHERE id = %s
-        """
-        result = db_connection.execute(sql, (transaction_id,))
-        if not result:
-            raise ValueError(f"Transaction {transaction_id} not found")
-
-        user_id, symbol, quantity, price = result[0]
-        total_amount = price * quantity
-
-        # Update wallet (UPSERT)
-        sql_wallet = """
-        INSERT INTO wallet (user_id, stock_symbol, quantity)
-        VALUES (%s, %s, %s)
-        ON CONFLICT (user_id, stock_symbol) 
-        DO UPDATE SET quantity = wallet.quantity + EXCLUDED.quantity
-        """
-        db_connection.execute(sql_wallet, (user_id, symbol, quantity))
-
-        # Update user balance
-        sql_balance = """
-        UPDATE users 
-        SET balance = balance - %s 
-        WHERE id = %s
-        """
-        db_connection.execute(sql_balance, (total_amount, user_id))
@@ -1,4 +1,81 @@
+import os
+import time
+from typing import Callable
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, status
+from limits import parse
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
-limiter = Limiter(key_func=get_remote_address)
+from backend.core.cache import TTLCache
+
+load_dotenv()
+
+# Use a shared store (e.g. redis://host:6379/0) so limits hold across workers
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=os.getenv("RATE_LIMIT_STORAGE_URI", "memory://"),
+    strategy="fixed-window",
+    default_limits=[],
+)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously from the monotonic clock.
+    """
+
+    __slots__ = ("tokens", "last", "rate", "capacity")
+
+    def __init__(self, capacity: float, rate: float):
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.rate = rate
+        self.capacity = capacity
+
+    def consume(self) -> bool:
+        """
+        Take one token from the bucket.
+        Returns:
+            bool: True if a token was available, False if the request must be denied.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+def local_limit(limit_value: str, maxsize: int = 10000) -> Callable[[Request], None]:
+    """
+    Dependency that keeps a process-local token bucket per client address.
+    Clients that drained their bucket are rejected here without a round trip to
+    the limiter storage, and bursts at the shared fixed-window boundary are smoothed.
+    Args:
+        limit_value (str): Limit in slowapi notation, e.g. "10/minute".
+        maxsize (int): Maximum number of client addresses tracked.
+    Returns:
+        Callable: FastAPI dependency raising 429 for clients over the limit.
+    """
+    item = parse(limit_value)
+    capacity, period = item.amount, item.get_expiry()
+    rate = capacity / period
+    buckets = TTLCache(maxsize=maxsize, ttl=period)
+
+    async def check(request: Request) -> None:
+        key = get_remote_address(request)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(capacity, rate)
+        buckets.set(key, bucket)
+
+        if not bucket.consume():
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded: {item}",
+            )
+
+    return check
@@ -1,17 +1,55 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
 import yfinance as yf
 
+from backend.core.cache import TTLCache
 from backend.models import HistoryRecord, PaginatedHistory
 
+# Widest ticker shape accepted by the stock routes
+_SYMBOL_RE = re.compile(r"^[A-Z0-9.]{1,10}$")
 
-class Stock:
+# Quotes are reused for a few seconds by every caller, each .info read is a
+# round-trip to Yahoo Finance
+_info_cache = TTLCache(
+    maxsize=2048, ttl=float(os.getenv("QUOTE_CACHE_TTL_SECONDS", "15"))
+)
+
+# Daily closes per (symbol, days), shared by all the pages of a period
+_history_series = TTLCache(
+    maxsize=256, ttl=float(os.getenv("HISTORY_CACHE_TTL_SECONDS", "300"))
+)
+
+# Company profile fields barely change, they are kept far longer than quotes
+_profile_cache = TTLCache(
+    maxsize=2048, ttl=float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "86400"))
+)
+_PROFILE_FIELDS = ("sector", "industry", "longBusinessSummary")
+
+# quoteSummary modules holding every field read by fetch_data; assetProfile only
+# holds the profile fields and is skipped while they are cached
+_QUOTE_MODULES = ["price", "summaryDetail", "financialData"]
+_INFO_MODULES = _QUOTE_MODULES + ["assetProfile"]
+
+# Yahoo Finance calls running at once in this process, whichever pool runs them
+_YF_MAX_WORKERS = int(os.getenv("YF_MAX_WORKERS", "16"))
+_YF_TIMEOUT = float(os.getenv("YF_TIMEOUT_SECONDS", "8"))
+_yf_calls = threading.BoundedSemaphore(_YF_MAX_WORKERS)
+
+# Quotes for several symbols are fetched in parallel
+_fetch_executor = ThreadPoolExecutor(
+    max_workers=_YF_MAX_WORKERS, thread_name_prefix="stock-fetch"
+)
 
-    def __new__(cls, *args, **kwargs):
-        """
-        Singleton pattern to ensure only one instance of Stock exists.
-        """
-        if not hasattr(cls, "_instance"):
-            cls._instance = super(Stock, cls).__new__(cls)
-        return cls._instance
+
+class Stock:
+    """
+    Stock data for a single ticker symbol.
+    A new instance is created per request, so concurrent requests never share state.
+    """
 
     def __init__(self, symbol: str):
         if not self._validate_symbol(symbol):
@@ -28,49 +66,263 @@ class Stock:
         Returns:
             bool: True if the symbol is valid, False otherwise.
         """
-        import re
+        return bool(_SYMBOL_RE.match(symbol))
+
+    @staticmethod
+    def cached_data(symbol: str) -> Optional[dict]:
+        """
+        Return the stock data fetched for the symbol within the cache TTL.
+        Args:
+            symbol (str): Stock symbol.
+        Returns:
+            dict: The cached stock information, or None if not cached.
+        """
+        return _info_cache.get(symbol)
+
+    @staticmethod
+    def cache_data(symbol: str, info: dict) -> None:
+        """
+        Keep stock data obtained elsewhere, e.g. from another worker, in the cache.
+        Args:
+            symbol (str): Stock symbol.
+            info (dict): Stock information, as returned by fetch_data.
+        """
+        _info_cache.set(symbol, info)
+
+    @staticmethod
+    def cached_history(symbol: str, days: int) -> Optional[tuple]:
+        """
+        Return the closing prices of the period downloaded within the cache TTL.
+        Args:
+            symbol (str): Stock symbol.
+            days (int): Number of days of the period.
+        Returns:
+            tuple: Dates formatted as YYYY-MM-DD and the matching closing prices,
+                or None if not cached.
+        """
+        return _history_series.get((symbol, days))
+
+    @staticmethod
+    def cache_history(symbol: str, days: int, series: tuple) -> None:
+        """
+        Keep closing prices obtained elsewhere, e.g. from another worker, in the
+        cache, so the pages of the period are sliced from them.
+        Args:
+            symbol (str): Stock symbol.
+            days (int): Number of days of the period.
+            series (tuple): Dates and closing prices, as in cached_history.
+        """
+        _history_series.set((symbol, days), series)
+
+    @staticmethod
+    def fetch_many(
+        symbols: List[str], refresh: bool = False, return_exceptions: bool = False
+    ) -> Dict[str, dict]:
+        """
+        Fetch stock data for several symbols concurrently.
+        Cached symbols are served from memory, duplicates are fetched once.
+        Args:
+            symbols (List[str]): Stock symbols.
+            refresh (bool): Fetch from Yahoo Finance even for cached symbols.
+            return_exceptions (bool): Return the error of a failed symbol in place
+                of its data instead of raising it.
+        Returns:
+            Dict[str, dict]: Stock information by symbol, as returned by fetch_data.
+        Raises:
+            ValueError: If any symbol is invalid or its data cannot be fetched.
+            concurrent.futures.TimeoutError: If the batch takes longer than
+                YF_TIMEOUT_SECONDS.
+        """
+        unique = list(dict.fromkeys(symbols))
+        stocks = [Stock(symbol) for symbol in unique]
+
+        def fetch(stock: Stock):
+            try:
+                return stock.fetch_data(refresh)
+            except ValueError as e:
+                if not return_exceptions:
+                    raise
+                return e
+
+        results = _fetch_executor.map(fetch, stocks, timeout=_YF_TIMEOUT)
+        return dict(zip(unique, results))
+
+    @staticmethod
+    def fetch_many_history(
+        symbols: List[str], days: int, page: int, page_size: int = 365
+    ) -> Dict[str, PaginatedHistory]:
+        """
+        Fetch one page of historical data for several symbols.
+        Periods not cached yet are downloaded together with a single yf.download.
+        Args:
+            symbols (List[str]): Stock symbols.
+            days (int): Number of days to fetch historical data for.
+            page (int): Page number for pagination.
+            page_size (int): Number of records per page.
+        Returns:
+            Dict[str, PaginatedHistory]: Paginated historical data by symbol.
+        Raises:
+            ValueError: If any symbol is invalid or has no data for the page.
+        """
+        stocks = [Stock(symbol) for symbol in dict.fromkeys(symbols)]
+        missing = [
+            stock.symbol
+            for stock in stocks
+            if _history_series.get((stock.symbol, days)) is None
+        ]
+
+        if len(missing) > 1:
+            with _yf_calls:
+                frame = yf.download(
+                    missing,
+                    period=f"{days}d",
+                    group_by="ticker",
+                    threads=True,
+                    progress=False,
+                )
+            for symbol in missing:
+                if symbol not in frame.columns.get_level_values(0):
+                    continue
+                closes = frame[symbol]["Close"].dropna()
+                if not closes.empty:
+                    _history_series.set(
+                        (symbol, days),
+                        (closes.index.strftime("%Y-%m-%d").tolist(), closes.tolist()),
+                    )
 
-        pattern = r"^[A-Z.]{1,5}$"
-        return bool(re.match(pattern, symbol))
+        # Symbols the batch could not fill fall back to their own download
+        return {
+            stock.symbol: stock.fetch_historical_data(days, page, page_size)
+            for stock in stocks
+        }
 
-    def fetch_data(self):
+    def fetch_data(self, refresh: bool = False):
         """
-        Fetch stock data from Yahoo Finance using yfinance.
+        Fetch stock data from Yahoo Finance using yfinance, reusing the cached
+        result for the symbol when there is one.
+        The variation from the previous close is computed while building the result.
+        Args:
+            refresh (bool): Fetch from Yahoo Finance even if the symbol is cached.
         Returns:
             dict: A dictionary containing stock information.
         Raises:
             ValueError: If the stock symbol is invalid or data cannot be fetched.
         """
+        cached = None if refresh else _info_cache.get(self.symbol)
+        if cached is not None:
+            return cached
+
         try:
 
             self.data = yf.Ticker(self.symbol)
+            profile = _profile_cache.get(self.symbol)
+            with _yf_calls:
+                info = self._fetch_info(
+                    self.data, _INFO_MODULES if profile is None else _QUOTE_MODULES
+                )
 
-            if not self.data.info:
+            if not info:
                 raise ValueError(f"Could not fetch data for {self.symbol}")
 
-            return {
+            if profile is None:
+                profile = {field: info.get(field) for field in _PROFILE_FIELDS}
+                _profile_cache.set(self.symbol, profile)
+
+            get = info.get
+            previous_close = get("previousClose")
+            market_price = get("regularMarketPrice")
+            # Yahoo omits margins for some tickers, they are reported as missing
+            gross_margin = get("grossMargins")
+            net_margin = get("profitMargins")
+
+            result = {
                 "success": True,
                 "data": {
-                    "Name": self.data.info.get("shortName"),
-                    "P/E": self.data.info.get("trailingPE"),
-                    "EBITDA": self.data.info.get("ebitda"),
-                    "Gross Margin": float(self.data.info.get("grossMargins") * 100),
-                    "Net Margin": float(self.data.info.get("profitMargins") * 100),
-                    "Sector": self.data.info.get("sector"),
-                    "Industry": self.data.info.get("industry"),
-                    "Description": self.data.info.get("longBusinessSummary"),
-                    "Actual Price": self.data.info.get("currentPrice"),
-                    "Previous Close": self.data.info.get("previousClose"),
-                    "Regular Market Price": self.data.info.get("regularMarketPrice"),
-                    "Market Cap": self.data.info.get("marketCap"),
-                    "Dividend Rate": self.data.info.get("dividendRate"),
-                    "Dividend Yield": self.data.info.get("dividendYield"),
+                    "Name": get("shortName"),
+                    "P/E": get("trailingPE"),
+                    "EBITDA": get("ebitda"),
+                    "Gross Margin": (
+                        gross_margin * 100.0 if gross_margin is not None else None
+                    ),
+                    "Net Margin": (
+                        net_margin * 100.0 if net_margin is not None else None
+                    ),
+                    "Sector": profile["sector"],
+                    "Industry": profile["industry"],
+                    "Description": profile["longBusinessSummary"],
+                    "Actual Price": get("currentPrice"),
+                    "Previous Close": previous_close,
+                    "Regular Market Price": market_price,
+                    "Market Cap": get("marketCap"),
+                    "Dividend Rate": get("dividendRate"),
+                    "Dividend Yield": get("dividendYield"),
+                    "Variation": (
+                        (market_price - previous_close) / previous_close * 100
+                        if previous_close and market_price
+                        else None
+                    ),
                 },
                 "message": "Stock info fetched successfully",
             }
         except Exception as e:
             raise ValueError(f"Error fetching data for {self.symbol}: {str(e)}")
 
+        _info_cache.set(self.symbol, result)
+        return result
+
+    def _fetch_info(self, ticker: yf.Ticker, modules: List[str]) -> dict:
+        """
+        Read only the quoteSummary modules used by fetch_data, in a single request.
+        Ticker.info asks for more modules and also calls the quote endpoint; it is
+        used as a fallback if the request fails.
+        Args:
+            ticker (yf.Ticker): Ticker of the symbol.
+            modules (List[str]): quoteSummary modules to read.
+        Returns:
+            dict: Fields of the requested modules, merged in a flat dictionary.
+        """
+        try:
+            # Same request Ticker.info makes, through yfinance's cookie and crumb
+            result = ticker._quote._fetch(modules=modules)
+            modules = result["quoteSummary"]["result"][0]
+        except Exception:
+            return ticker.info
+
+        info = {}
+        for module in modules.values():
+            if isinstance(module, dict):
+                info.update(module)
+        return info
+
+    def _fetch_history_series(self, days: int) -> tuple:
+        """
+        Download the closing prices of the period once and keep them, so every
+        page of the same period is sliced from a single download.
+        Args:
+            days (int): Number of days to fetch historical data for.
+        Returns:
+            tuple: Dates formatted as YYYY-MM-DD and the matching closing prices.
+        """
+        key = (self.symbol, days)
+        series = _history_series.get(key)
+        if series is not None:
+            return series
+
+        with _yf_calls:
+            history = yf.Ticker(self.symbol).history(period=f"{days}d")
+        if history.empty:
+            raise ValueError(
+                "No historical data found for the specified ticker and time period."
+            )
+
+        # Dates are formatted in one vectorized call for the whole period
+        series = (
+            history.index.strftime("%Y-%m-%d").tolist(),
+            history["Close"].tolist(),
+        )
+        _history_series.set(key, series)
+        return series
+
     def fetch_historical_data(
         self, days: int, page: int, page_size: int = 365
     ) -> PaginatedHistory:
@@ -84,36 +336,29 @@ class Stock:
             PaginatedHistory: Paginated historical stock data.
         """
         try:
-            stock = yf.Ticker(self.symbol)
-            history = stock.history(period=f"{days}d")
-
-            if history.empty:
-                raise ValueError(
-                    "No historical data found for the specified ticker and time period."
-                )
+            dates, closes = self._fetch_history_series(days)
 
             # Pagination
-            history.reset_index(inplace=True)
-            history = history[["Date", "Close"]]
+            total_records = len(dates)
             start = (page - 1) * page_size
             end = start + page_size
 
-            paginated_history = history.iloc[start:end]
-            if paginated_history.empty:
+            if start >= total_records:
                 raise ValueError("No data available for the requested page.")
 
+            # Built without validation, the values come straight from pandas
             records = [
-                HistoryRecord(date=row["Date"].strftime("%Y-%m-%d"), close=row["Close"])
-                for _, row in paginated_history.iterrows()
+                HistoryRecord.model_construct(date=date, close=close)
+                for date, close in zip(dates[start:end], closes[start:end])
             ]
 
-            return PaginatedHistory(
+            return PaginatedHistory.model_construct(
                 success=True,
                 pagination={
                     "current_page": page,
                     "page_size": page_size,
-                    "total_pages": (len(history) + page_size - 1) // page_size,
-                    "total_records": len(history),
+                    "total_pages": (total_records + page_size - 1) // page_size,
+                    "total_records": total_records,
                 },
                 data=records,
                 message="Historical data fetched successfully.",
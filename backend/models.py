@@ -1,8 +1,16 @@
+import hashlib
 import os
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
 from typing import List, Optional
 
 import psycopg2 as pg
 from dotenv import load_dotenv
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from pydantic import BaseModel, Field
 
 
@@ -44,6 +52,24 @@ class RequestHistoryParams(BaseModel):
     )
 
 
+class RequestBatchHistoryParams(BaseModel):
+    tickers: str = Field(
+        ...,
+        min_length=1,
+        description="Comma separated stock symbols, e.g., 'AAPL,MSFT'",
+    )
+    days: int = Field(
+        ...,
+        gt=0,
+        le=1825,
+        description="Number of days for consulting the history of the stocks (between 1 and 1825)",
+    )
+
+    page: int = Field(
+        1, gt=0, description="Number of the page for pagination (default: 1)"
+    )
+
+
 # Model for Calculate validation
 class CalculationRequest(BaseModel):
     initial_value: float = Field(
@@ -59,7 +85,16 @@ class CalculationRequest(BaseModel):
         ..., gt=0.0, description="Annual interest rate.", title="Annual Interest"
     )
     months: int = Field(
-        ..., gt=0, description="Number of months for calculation", title="Months"
+        ...,
+        gt=0,
+        le=1200,
+        description="Number of months for calculation",
+        title="Months",
+    )
+    columnar: bool = Field(
+        False,
+        description="Return the monthly breakdown as one list per field",
+        title="Columnar",
     )
 
 
@@ -72,54 +107,280 @@ class ResponseCalculation(BaseModel):
 
 load_dotenv()
 
+_PLACEHOLDER_RE = re.compile(r"%s")
+
+_QUERY_TYPE_RE = re.compile(r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+_RETURNING_RE = re.compile(r"\bRETURNING\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=256)
+def _query_type(query: str) -> tuple:
+    """
+    Classify a query. Queries are module constants, so each is classified once.
+    Returns:
+        tuple: Statement type in upper case (None if not allowed) and whether the
+            query has a RETURNING clause.
+    """
+    match = _QUERY_TYPE_RE.match(query)
+    query_type = match.group(1).upper() if match else None
+    return query_type, bool(_RETURNING_RE.search(query))
+
+
+_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "20"))
+
+# Errors after which the connection itself can no longer be trusted
+_CONNECTION_ERRORS = (pg.OperationalError, pg.InterfaceError)
+
+
+def _connection_params() -> dict:
+    return {
+        "dbname": os.getenv("DB_NAME"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+        "host": os.getenv("DB_HOST"),
+        "port": os.getenv("DB_PORT"),
+    }
+
+
+class _PooledConnection(pg.extensions.connection):
+    """
+    psycopg2 connection that remembers the statements prepared in its session.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
 
 class Connection(object):
+    """
+    Access to PostgreSQL through a pool of established connections.
+    Each thread works on its own pooled connection: it is checked out by the first
+    statement and given back on commit or rollback, or right after a SELECT run
+    outside a transaction. Threads wait for a free connection once all
+    DB_POOL_MAX_SIZE are in use.
+    """
+
     def __init__(self):
-        self.conn = None
-        self.cursor = None
+        self.pool = None
+        self._local = threading.local()
+        self._slots = threading.BoundedSemaphore(_POOL_MAX_SIZE)
         self._connect()
 
     def _connect(self):
-        if self.conn is None or self.conn.closed:
-            self.conn = pg.connect(
-                dbname=os.getenv("DB_NAME"),
-                user=os.getenv("DB_USER"),
-                password=os.getenv("DB_PASSWORD"),
-                host=os.getenv("DB_HOST"),
-                port=os.getenv("DB_PORT"),
+        if self.pool is None or self.pool.closed:
+            self.pool = ThreadedConnectionPool(
+                _POOL_MIN_SIZE,
+                _POOL_MAX_SIZE,
+                connection_factory=_PooledConnection,
+                **_connection_params(),
             )
-            self.cursor = self.conn.cursor()
-            self.conn.autocommit = False
-        elif self.cursor is None or self.cursor.closed:
-            self.cursor = self.conn.cursor()
 
-    def _validate_query(self, query: str, params=None):
+    def connect_direct(self):
+        """
+        Open a connection outside the pool, e.g. to LISTEN for notifications.
+        The caller owns it and must close it.
+        """
+        return pg.connect(**_connection_params())
+
+    def _acquire(self):
+        """
+        Return the connection and cursor of the current thread, checking one out
+        of the pool if the thread has none.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            if not conn.closed:
+                return conn, self._local.cursor
+            self._release(discard=True)
+
+        self._connect()
+        self._slots.acquire()
+        try:
+            conn = self.pool.getconn()
+            conn.autocommit = False
+            cursor = conn.cursor()
+        except Exception:
+            self._slots.release()
+            raise
+
+        self._local.conn = conn
+        self._local.cursor = cursor
+        self._local.in_transaction = False
+        return conn, cursor
+
+    def _release(self, discard: bool = False):
+        """
+        Give the connection of the current thread back to the pool, which rolls
+        back anything left uncommitted. Broken connections are discarded.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+
+        cursor = self._local.cursor
+        self._local.conn = None
+        self._local.cursor = None
+        self._local.in_transaction = False
+        try:
+            if not cursor.closed:
+                cursor.close()
+            if not self.pool.closed:
+                self.pool.putconn(conn, close=discard or bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    def _abort(self, error: Exception):
+        """
+        Give back a connection whose statement failed outside a transaction, so it
+        is rolled back instead of staying checked out in an aborted state.
+        Inside a transaction the caller's rollback does it.
+        """
+        if not getattr(self._local, "in_transaction", False):
+            self._release(discard=isinstance(error, _CONNECTION_ERRORS))
+
+    def _validate_query(self, query: str, params=None) -> str:
         if not isinstance(params, (tuple, list, type(None))):
             raise TypeError("params must be a tuple or list")
 
-        allowed_queries = {"SELECT", "INSERT", "UPDATE", "DELETE"}
-        query_type = query.strip().split()[0].upper()
-        if query_type not in allowed_queries:
+        query_type, _ = _query_type(query)
+        if query_type is None:
             raise ValueError("Invalid query type")
+        return query_type
 
-    def _execute_query(self, query: str, params=None):
-        self._connect()
-        self.cursor.execute(query, params or ())
+    def _prepare(self, conn, cursor, query: str) -> str:
+        """
+        Prepare the query once per connection and return the matching EXECUTE.
+        Args:
+            query (str): Query using %s placeholders.
+        Returns:
+            str: EXECUTE statement taking the same parameters as the query.
+        """
+        name = "stmt_" + hashlib.sha1(query.encode()).hexdigest()[:16]
+        count = query.count("%s")
+
+        if name not in conn.prepared:
+            numbers = iter(range(1, count + 1))
+            statement = _PLACEHOLDER_RE.sub(
+                lambda _: f"${next(numbers)}", query.strip().rstrip(";")
+            )
+            cursor.execute(f"PREPARE {name} AS {statement}")
+            conn.prepared.add(name)
 
-        query_lower = query.strip().lower()
-        if query_lower.startswith("select"):
-            return self.cursor.fetchall()
-        elif query_lower.startswith("insert") and "returning" in query_lower:
-            return self.cursor.fetchone()
-        return self.cursor.rowcount
+        if not count:
+            return f"EXECUTE {name}"
+        return f"EXECUTE {name} ({', '.join(['%s'] * count)})"
 
-    def execute(self, query: str, params=None):
+    def _execute_query(
+        self, query: str, params=None, prepare: bool = False, fetch: str = "all"
+    ):
+        conn, cursor = self._acquire()
+        try:
+            statement = self._prepare(conn, cursor, query) if prepare else query
+            cursor.execute(statement, params or ())
+        except Exception as e:
+            self._abort(e)
+            raise
+
+        query_type, returning = _query_type(query)
+        if query_type == "SELECT":
+            try:
+                result = cursor.fetchone() if fetch == "one" else cursor.fetchall()
+            except Exception as e:
+                self._abort(e)
+                raise
+            if not self._local.in_transaction:
+                self._release()
+            return result
+
+        self._local.in_transaction = True
+        if query_type == "WITH":
+            # CTEs may end in a SELECT or in a data-modifying statement
+            if cursor.description is not None:
+                return cursor.fetchone() if fetch == "one" else cursor.fetchall()
+            return cursor.rowcount
+        elif query_type == "INSERT" and returning:
+            return cursor.fetchone()
+        return cursor.rowcount
+
+    def _retry(self, func, *args):
+        """
+        Run func, retrying once on a fresh connection if the current one was lost
+        before any statement of the transaction ran on it.
+        """
+        try:
+            return func(*args)
+        except _CONNECTION_ERRORS:
+            in_transaction = getattr(self._local, "in_transaction", False)
+            self._release(discard=True)
+            if in_transaction:
+                raise
+            return func(*args)
+
+    def execute(
+        self, query: str, params=None, prepare: bool = False, fetch: str = "all"
+    ):
+        """
+        Run a SELECT/INSERT/UPDATE/DELETE query, or a WITH query built from them.
+        With prepare=True the query is planned once per connection and later calls
+        only send the parameters, worth it for queries run on every request.
+        Queries returning rows give a list of them, or with fetch="one" only the
+        first row (None if there is none).
+        """
         self._validate_query(query, params)
+        if fetch not in ("all", "one"):
+            raise ValueError('fetch must be "all" or "one"')
+        return self._retry(self._execute_query, query, params, prepare, fetch)
+
+    def stream(self, query: str, params=None, itersize: int = 2000):
+        """
+        Iterate over the rows of a SELECT without loading them all in memory.
+        Rows are read through a server-side cursor, itersize rows per round-trip.
+        The iterator must be consumed in the thread that created it.
+        """
+        if self._validate_query(query, params) != "SELECT":
+            raise ValueError("stream only accepts SELECT queries")
+
+        conn, _ = self._acquire()
+        cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+        cursor.itersize = itersize
+        failed = False
+        try:
+            cursor.execute(query, params or ())
+            yield from cursor
+        except Exception as e:
+            # The rollback drops the server-side cursor, closing it would fail
+            failed = True
+            self._abort(e)
+            raise
+        finally:
+            if not failed and not cursor.closed and not conn.closed:
+                cursor.close()
+            if not self._local.in_transaction:
+                self._release()
+
+    def _insert_many(self, query: str, rows: list, fetch: bool) -> list:
+        _, cursor = self._acquire()
         try:
-            return self._execute_query(query, params)
-        except (pg.OperationalError, pg.InterfaceError):
+            result = execute_values(cursor, query, rows, fetch=fetch)
+        except Exception as e:
+            self._abort(e)
+            raise
+        self._local.in_transaction = True
+        return result
 
-            return self._execute_query(query, params)
+    def insert_many(self, query: str, rows: list) -> list:
+        """
+        Insert several rows with a single statement.
+        The query takes one "VALUES %s" placeholder that is expanded for all rows;
+        rows produced by a RETURNING clause are returned in insertion order.
+        """
+        if self._validate_query(query, rows) != "INSERT":
+            raise ValueError("insert_many only accepts INSERT queries")
+
+        _, fetch = _query_type(query)
+        return self._retry(self._insert_many, query, rows, fetch)
 
     def get_email_user_by_id(self, user_id: int):
         """
@@ -131,22 +392,56 @@ class Connection(object):
             raise ValueError("Invalid user ID. It must be a positive integer.")
 
         select_user_query = "SELECT email FROM users WHERE id = %s"
-        result = self.execute(select_user_query, (user_id,))
+        row = self.execute(select_user_query, (user_id,), prepare=True, fetch="one")
 
-        if result and len(result) > 0:
-            return result[0][0]
+        if row:
+            return row[0]
         return None
 
+    @contextmanager
+    def transaction(self):
+        """
+        Run the enclosed statements as one transaction on the thread's connection,
+        committed when the block ends or rolled back if it raises. The connection
+        is held from the start, so every statement in the block runs on it.
+        """
+        self._acquire()
+        self._local.in_transaction = True
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        else:
+            self.commit()
+
+    def run_script(self, script: str):
+        """
+        Run a trusted schema script (DDL) in its own transaction and commit it.
+        """
+        with self.transaction():
+            _, cursor = self._acquire()
+            cursor.execute(script)
+
     def commit(self):
-        self._connect()
-        self.conn.commit()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        try:
+            conn.commit()
+        finally:
+            self._release()
 
     def rollback(self):
-        self._connect()
-        self.conn.rollback()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        try:
+            conn.rollback()
+        finally:
+            self._release()
 
     def close(self):
-        if self.cursor and not self.cursor.closed:
-            self.cursor.close()
-        if self.conn and not self.conn.closed:
-            self.conn.close()
+        self._release()
+        if self.pool is not None and not self.pool.closed:
+            self.pool.closeall()
@@ -1,6 +1,6 @@
 from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 
 # Model for payment item
@@ -8,11 +8,16 @@ class PaymentItem(BaseModel):
     symbol: str = Field(..., description="Stock symbol (e.g., 'AAPL')")
     quantity: int = Field(..., gt=0, description="Quantity")
 
+    @field_validator("symbol")
+    @classmethod
+    def normalize_symbol(cls, value: str) -> str:
+        return value.strip().upper()
+
 
 # Model for payment request
 class PaymentRequest(BaseModel):
     user_id: int = Field(..., gt=0, description="User ID")
-    items: list[PaymentItem] = Field(..., description="List of items")
+    items: list[PaymentItem] = Field(..., min_length=1, description="List of items")
 
 
 # Model for payment response
@@ -33,6 +38,8 @@ class WebhookPayload(BaseModel):
 
 
 class MPCallback(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     collection_id: str = Field(..., description="Collection ID")
     collection_status: str = Field(..., description="Collection status")
     payment_id: str = Field(..., description="Payment ID")
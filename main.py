@@ -1,10 +1,18 @@
+import asyncio
 import datetime
 import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
 from zoneinfo import ZoneInfo
 
+import anyio.to_thread
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
@@ -13,7 +21,10 @@ from backend import db_connection
 from backend.api.auth_routes import auth_router
 from backend.api.calculation_routes import calculation_router
 from backend.api.mercadopago_routes import mp_callback_router, payment_router
-from backend.api.stock_routes import stock_router
+from backend.api.stock_routes import refresh_hot_quotes, stock_router
+from backend.core.cache import close_redis
+from backend.core.captcha import close_client as close_captcha_client
+from backend.core.database import start_user_cache_listener
 from backend.core.rate_limit import limiter
 
 sp_timezone = ZoneInfo("America/Sao_Paulo")
@@ -30,11 +41,54 @@ logging.basicConfig(
     force=True,
 )
 
-app = FastAPI(title="Stock Quote API", version="2.0.0")
+
+class InfoSamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of INFO (and lower) records, warnings and errors always pass.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.INFO or random.random() < self.rate
+
+
+# Write log records from a background thread so requests never block on I/O
+_log_queue = queue.SimpleQueue()
+_root_logger = logging.getLogger()
+_log_listener = QueueListener(
+    _log_queue, *_root_logger.handlers, respect_handler_level=True
+)
+_queue_handler = QueueHandler(_log_queue)
+_info_sample_rate = float(os.getenv("LOG_INFO_SAMPLE_RATE", "1.0"))
+if _info_sample_rate < 1.0:
+    _queue_handler.addFilter(InfoSamplingFilter(_info_sample_rate))
+_root_logger.handlers = [_queue_handler]
+_log_listener.start()
+
+app = FastAPI(
+    title="Stock Quote API",
+    version="2.0.0",
+    default_response_class=ORJSONResponse,
+)
 
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception):
+    """
+    Last-resort handler for errors no route handled, logged with their traceback.
+    """
+    logging.error(
+        "Unhandled error on %s %s", request.method, request.url.path, exc_info=exc
+    )
+    return ORJSONResponse(status_code=500, content={"detail": "Internal server error"})
+
+
 app.include_router(stock_router)
 app.include_router(calculation_router)
 app.include_router(auth_router)
@@ -51,16 +105,40 @@ app.add_middleware(
 
 app.add_middleware(SlowAPIMiddleware)
 
+# Compress JSON bodies (history pages, stock descriptions) for clients sending
+# Accept-Encoding: gzip; level 5 costs half the CPU of 9 for nearly the same size
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=5)
+
+
+@app.on_event("startup")
+async def startup_event():
+    """
+    Event handler for application startup.
+    Sizes the thread pool that runs the blocking Yahoo Finance, database and
+    password hashing calls, which caps how many of them run at once, and starts
+    the refresh of the most requested quotes and the user cache invalidation.
+    """
+    thread_limiter = anyio.to_thread.current_default_thread_limiter()
+    thread_limiter.total_tokens = int(os.getenv("THREADPOOL_SIZE", "100"))
+    logging.info("Thread pool size: %s", thread_limiter.total_tokens)
+    app.state.quote_refresher = asyncio.create_task(refresh_hot_quotes())
+    app.state.user_cache_listener = start_user_cache_listener()
+
 
 @app.on_event("shutdown")
-def shutdown_event():
+async def shutdown_event():
     """
     Event handler for application shutdown.
-    Closes the database connection.
+    Closes the database, Redis and reCAPTCHA connections.
     """
     logging.info("Shutting down the application.")
+    app.state.quote_refresher.cancel()
+    app.state.user_cache_listener.set()
     db_connection.close()
     logging.info("Database connection closed.")
+    await close_redis()
+    await close_captcha_client()
+    _log_listener.stop()
 
 
 if __name__ == "__main__":